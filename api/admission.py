@@ -0,0 +1,126 @@
+# admission.py
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+
+class AdmissionRejected(Exception):
+    """The model is at its concurrency limit and its wait queue is full (or the wait timed out)."""
+
+    def __init__(self, message: str, retry_after_s: int):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """
+    Per-model admission control: at most `max_concurrency` predictions run at
+    once, at most `max_queue` more wait (for up to `queue_timeout_ms`), and
+    anything beyond that is rejected straight away with a Retry-After hint
+    instead of piling up until clients time out and retry.
+
+    `shed_enrichment()` tells callers when the wait queue has reached
+    `shed_queue_depth`, so optional work (the weather lookup) can be skipped
+    and capacity kept for the prediction itself.
+
+    `max_concurrency <= 0` disables admission control.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 32,
+        max_queue: int = 64,
+        queue_timeout_ms: float = 2000.0,
+        shed_queue_depth: int = 16,
+    ):
+        self.name = name
+        self.max_concurrency = int(max_concurrency)
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_s = max(0.0, float(queue_timeout_ms)) / 1000.0
+        self.shed_queue_depth = int(shed_queue_depth)
+        self._slots = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        self.in_flight = 0
+        self.waiting = 0
+        # moving average of how long an admitted prediction holds its slot
+        self.avg_service_s = 0.05
+
+        # stats
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.shed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def retry_after(self) -> int:
+        """Seconds until a retry is likely to be admitted (>= 1)."""
+        backlog = (self.in_flight + self.waiting) / max(1, self.max_concurrency)
+        return max(1, math.ceil(backlog * self.avg_service_s))
+
+    def shed_enrichment(self) -> bool:
+        """True (and counted) when optional work should be skipped for a new request."""
+        if not self.enabled or self.shed_queue_depth <= 0 or self.waiting < self.shed_queue_depth:
+            return False
+        self.shed += 1
+        return True
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the bounded queue if needed; raises AdmissionRejected."""
+        if not self.enabled:
+            return
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(f"{self.name}: {self.in_flight} running, {self.waiting} waiting", self.retry_after())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s or None)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise AdmissionRejected(f"{self.name}: waited {self.queue_timeout_s:.1f}s for a slot", self.retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, service_s: float) -> None:
+        """Give back a slot held for `service_s` seconds."""
+        if not self.enabled:
+            return
+        self.in_flight -= 1
+        self.avg_service_s += 0.1 * (service_s - self.avg_service_s)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """`async with controller.slot():` around the work being limited; raises AdmissionRejected."""
+        await self.acquire()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - t0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": round(self.queue_timeout_s * 1000.0, 1),
+            "shed_queue_depth": self.shed_queue_depth,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_service_ms": round(self.avg_service_s * 1000.0, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "shed": self.shed,
+        }
@@ -0,0 +1,172 @@
+# batching.py
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("agri-api")
+
+
+class BatchQueueFull(Exception):
+    """Raised when a batcher already has `max_queue` requests waiting."""
+
+
+class MicroBatcher:
+    """
+    Collect single-image requests for one model and run them as one batched
+    forward pass.
+
+    Callers `await submit(x)` with a (1, H, W, C) array and get back their own
+    row of predictions. A background task drains the queue: it waits for the
+    first request, then keeps collecting until `max_batch_size` requests are
+    pending or `max_wait_ms` has passed, whichever comes first.
+
+    If `executor` is given, the forward pass runs there instead of on the
+    event loop, and up to `max_concurrent_batches` batches are in flight at
+    once (match it to the executor's threads). The worker only starts
+    collecting the next batch once a slot is free, so while all of them are
+    busy new requests pile up into a bigger batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 256,
+        executor: Optional[Executor] = None,
+        max_concurrent_batches: int = 1,
+    ):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        # without an executor the forward pass blocks the loop, so there is nothing to overlap
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches)) if executor is not None else 1
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # stats
+        self.requests = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.batch_sizes: Counter = Counter()
+
+    # -----------------------
+    # public API
+    # -----------------------
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, x: np.ndarray) -> np.ndarray:
+        """Queue one (1, H, W, C) input and wait for its prediction row."""
+        self._ensure_worker()
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise BatchQueueFull(f"{self.name} batch queue is full ({self.max_queue} pending)")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((x, fut))
+        self.requests += 1
+        return await fut
+
+    def stats(self) -> Dict[str, Any]:
+        avg = self.batched_items / self.batches if self.batches else None
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches_in_flight": len(self._in_flight),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": round(avg, 2) if avg is not None else None,
+            "last_batch_size": self.last_batch_size,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
+
+    # -----------------------
+    # worker
+    # -----------------------
+    def _ensure_worker(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            # take whatever is already queued without yielding
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # callers that gave up (client disconnect, timeout) don't need a row
+        return [(x, fut) for x, fut in items if not fut.cancelled()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                items = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not items:
+                self._slots.release()
+                continue
+            task = loop.create_task(self._run_batch(items))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, items: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        try:
+            # inside the try: mismatched shapes must fail these callers, not the worker
+            batch = np.concatenate([x for x, _ in items], axis=0)
+            preds = await self._predict(batch)
+        except Exception as e:
+            logger.exception("Batched prediction failed for %s: %s", self.name, e)
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        self.batches += 1
+        self.batched_items += len(items)
+        self.last_batch_size = len(items)
+        self.batch_sizes[len(items)] += 1
+        for i, (_, fut) in enumerate(items):
+            if not fut.done():
+                fut.set_result(preds[i])
+
+    async def _predict(self, batch: np.ndarray) -> np.ndarray:
+        if self.executor is None:
+            return np.asarray(self.predict_fn(batch))
+        loop = asyncio.get_running_loop()
+        return np.asarray(await loop.run_in_executor(self.executor, self.predict_fn, batch))
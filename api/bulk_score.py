@@ -0,0 +1,237 @@
+# bulk_score.py
+"""
+Offline bulk scoring of image archives (no HTTP).
+
+    python -m api.bulk_score --input archive/ --output scores.jsonl
+    python -m api.bulk_score --manifest images.csv --output scores.csv --batch-size 64
+
+`--input` expects one folder per crop (archive/rice/..., archive/potato/...);
+`--manifest` is a CSV with `path,crop_type` columns (paths relative to the
+manifest). Images are decoded in parallel by a tf.data pipeline using the same
+preprocessing as /predict, batched per crop model and prefetched while the
+model runs. Results are appended and flushed per batch, so re-running the same
+command after an interruption skips everything already scored. Images whose
+model was not available (or whose crop_type is unknown) are tried again; their
+old rows are removed from the output first, so it keeps one row per image.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+FIELDS = ["path", "crop_type", "predicted_class", "confidence", "model_version", "error"]
+# errors that say nothing about the image itself: such rows are retried on the next run
+RETRY_ERRORS = {"model not available", "unknown crop_type"}
+
+
+# -----------------------
+# inputs / outputs
+# -----------------------
+def scan_directory(root: str, crops: Iterable[str]) -> List[Tuple[str, str]]:
+    items = []
+    for crop in crops:
+        crop_dir = os.path.join(root, crop)
+        for dirpath, _, files in os.walk(crop_dir):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    items.append((os.path.join(dirpath, name), crop))
+    return items
+
+
+def read_manifest(path: str) -> List[Tuple[str, str]]:
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            (os.path.join(base, row["path"]), row["crop_type"].strip().lower())
+            for row in csv.DictReader(f)
+        ]
+
+
+def read_results(output: str, fmt: str) -> Tuple[List[Dict], bool]:
+    """(complete rows in `output`, whether an interrupted run left a half-written one)."""
+    with open(output, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            rows = list(csv.DictReader(f))
+            complete = [row for row in rows if None not in row.values()]
+            return complete, len(complete) != len(rows)
+        rows, partial = [], False
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                partial = True
+        return rows, partial
+
+
+def resume_output(output: str, fmt: str) -> Set[str]:
+    """
+    Paths with a result in `output`, which is compacted to exactly one row per
+    such path: rows failed for RETRY_ERRORS (e.g. the model file was missing)
+    are dropped since this run writes them again, as are earlier rows for a
+    path that was scored later and a half-written last row.
+    """
+    if not os.path.exists(output) or os.path.getsize(output) == 0:
+        return set()
+    rows, partial = read_results(output, fmt)
+    kept: Dict[str, Dict] = {}
+    for row in rows:
+        if row.get("path") and row.get("error") not in RETRY_ERRORS:
+            kept.pop(row["path"], None)
+            kept[row["path"]] = row  # the last row for a path wins
+    if partial or len(kept) != len(rows):
+        tmp = output + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(kept.values())
+            else:
+                f.writelines(json.dumps(row) + "\n" for row in kept.values())
+        os.replace(tmp, output)  # an interruption here leaves the old file intact
+    return set(kept)
+
+
+class ResultWriter:
+    def __init__(self, path: str, fmt: str):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.fmt = fmt
+        self.f = open(path, "a", newline="", encoding="utf-8")
+        if not new_file and not _ends_with_newline(path):
+            self.f.write("\n")  # end the row an interrupted run left half written
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.f, fieldnames=FIELDS)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, rows: List[Dict]) -> None:
+        for row in rows:
+            if self.fmt == "csv":
+                self.csv.writerow(row)
+            else:
+                self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+# -----------------------
+# tf.data pipeline
+# -----------------------
+def build_dataset(paths: List[str], spec, batch_size: int, parallelism: int) -> tf.data.Dataset:
+    from api.preprocessing import preprocess_image
+
+    size = spec.input_size
+
+    def _load(path: bytes):
+        out = np.zeros((size, size, 3), dtype=np.float32)
+        try:
+            with open(path.decode(), "rb") as f:
+                preprocess_image(f.read(), size, spec.preprocessing, out=out)
+            return out, True
+        except Exception:
+            return out, False
+
+    def _map(path):
+        image, ok = tf.numpy_function(_load, [path], [tf.float32, tf.bool], stateful=False)
+        image.set_shape([size, size, 3])
+        ok.set_shape([])
+        return path, image, ok
+
+    ds = tf.data.Dataset.from_tensor_slices(paths)
+    ds = ds.map(_map, num_parallel_calls=parallelism, deterministic=True)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def score_crop(crop: str, paths: List[str], registry, writer: ResultWriter, batch_size: int, parallelism: int) -> int:
+    entry = registry.get(crop)
+    if entry is None:
+        writer.write([{"path": p, "crop_type": crop, "predicted_class": None, "confidence": None,
+                       "model_version": None, "error": "model not available"} for p in paths])
+        return 0
+    spec = entry.spec
+    scored = 0
+    t0 = time.perf_counter()
+    for batch_paths, images, ok in build_dataset(paths, spec, batch_size, parallelism):
+        preds = np.asarray(entry.model.predict(images.numpy()))
+        rows = []
+        for p, row, good in zip(batch_paths.numpy(), preds, ok.numpy()):
+            p = p.decode()
+            if good:
+                idx = int(np.argmax(row))
+                rows.append({"path": p, "crop_type": crop, "predicted_class": spec.classes[idx],
+                             "confidence": float(row[idx]), "model_version": entry.version, "error": None})
+            else:
+                rows.append({"path": p, "crop_type": crop, "predicted_class": None, "confidence": None,
+                             "model_version": entry.version, "error": "could not read image"})
+        writer.write(rows)
+        scored += len(rows)
+        elapsed = time.perf_counter() - t0
+        print(f"\r{crop}: {scored}/{len(paths)} images, {scored / elapsed:.1f} img/s", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input", help="directory with one sub-folder per crop")
+    src.add_argument("--manifest", help="CSV with path,crop_type columns")
+    parser.add_argument("--output", required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="default: from the output extension")
+    parser.add_argument("--crops", help="comma separated subset of crops to score")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--parallelism", type=int, default=tf.data.AUTOTUNE, help="parallel decodes (default: autotune)")
+    args = parser.parse_args()
+
+    from api.main import REGISTRY
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    crops = [c.strip().lower() for c in args.crops.split(",")] if args.crops else REGISTRY.crops
+    items = scan_directory(args.input, crops) if args.input else read_manifest(args.manifest)
+
+    done = resume_output(args.output, fmt)
+    by_crop: Dict[str, List[str]] = {}
+    unknown = []
+    for path, crop in items:
+        if path in done or (args.crops and crop not in crops):
+            continue
+        if REGISTRY.spec(crop) is None:
+            unknown.append({"path": path, "crop_type": crop, "predicted_class": None, "confidence": None,
+                            "model_version": None, "error": "unknown crop_type"})
+            continue
+        by_crop.setdefault(crop, []).append(path)
+
+    total = sum(len(v) for v in by_crop.values())
+    print(f"{len(items)} images found, {len(done)} already scored, {total} to score", file=sys.stderr)
+
+    writer = ResultWriter(args.output, fmt)
+    t0 = time.perf_counter()
+    scored = 0
+    try:
+        writer.write(unknown)
+        for crop, paths in by_crop.items():
+            scored += score_crop(crop, paths, REGISTRY, writer, args.batch_size, args.parallelism)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - t0
+    summary = {"scored": scored, "skipped": len(done), "seconds": round(elapsed, 2),
+               "images_per_sec": round(scored / elapsed, 2) if elapsed > 0 else None}
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire `ttl_s` seconds after being set.
+
+    Thread-safe; `max_entries <= 0` disables caching (every get is a miss).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = int(max_entries)
+        self.ttl_s = float(ttl_s)
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_with_age(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Return (value, seconds since it was set) or None; counts a hit/miss."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return None
+            value, stored_at = item
+            age = self._clock() - stored_at
+            if age > self.ttl_s:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, age
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since `key` was set, or None if absent / expired. A peek: no stats, no LRU bump."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return None
+            age = self._clock() - item[1]
+            return age if age <= self.ttl_s else None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.get_with_age(key)
+        return default if item is None else item[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return None if item is None else item[0]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`; returns how many were dropped."""
+        with self._lock:
+            doomed = [k for k in self._data if predicate(k)]
+            for k in doomed:
+                del self._data[k]
+            self.invalidations += len(doomed)
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+def content_digest(data: bytes) -> str:
+    """Stable hash of uploaded bytes for content-addressed caching."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
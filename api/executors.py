@@ -0,0 +1,91 @@
+# executors.py
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("agri-api")
+
+BACKENDS = ("threads", "inline")
+
+
+class ExecutionBackend:
+    """
+    Where blocking work runs so the asyncio thread stays free for /ping,
+    /treatment and new connections.
+
+    - "threads": image decode/resize goes to one bounded thread pool shared by
+      all requests, and each model gets its own dedicated inference executor
+      (so a slow rice batch never queues behind tomato, and one model's
+      batches are never run concurrently).
+    - "inline": everything runs on the event loop (old behaviour, handy for
+      debugging and profiling).
+    """
+
+    def __init__(
+        self,
+        backend: str = "threads",
+        preprocess_workers: int = 4,
+        preprocess_max_pending: int = 64,
+        inference_threads: int = 1,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown execution backend {backend!r} (use {'/'.join(BACKENDS)})")
+        self.backend = backend
+        self.preprocess_workers = max(1, int(preprocess_workers))
+        self.preprocess_max_pending = max(1, int(preprocess_max_pending))
+        self.inference_threads = max(1, int(inference_threads))
+
+        self._preprocess_pool: Optional[ThreadPoolExecutor] = None
+        self._preprocess_slots: Optional[asyncio.Semaphore] = None
+        self._inference_pools: Dict[str, ThreadPoolExecutor] = {}
+        self._preprocess_pending = 0
+
+    @property
+    def inline(self) -> bool:
+        return self.backend == "inline"
+
+    async def run_preprocess(self, fn: Callable[..., Any], *args) -> Any:
+        """Run a decode/resize job on the preprocessing pool and await its result."""
+        if self.inline:
+            return fn(*args)
+        if self._preprocess_pool is None:
+            self._preprocess_pool = ThreadPoolExecutor(
+                max_workers=self.preprocess_workers, thread_name_prefix="preprocess"
+            )
+            self._preprocess_slots = asyncio.Semaphore(self.preprocess_max_pending)
+        # the semaphore bounds queued + running jobs; waiting for it is async
+        async with self._preprocess_slots:
+            self._preprocess_pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._preprocess_pool, fn, *args)
+            finally:
+                self._preprocess_pending -= 1
+
+    def inference_executor(self, name: str) -> Optional[ThreadPoolExecutor]:
+        """Dedicated executor for one model (None when running inline)."""
+        if self.inline:
+            return None
+        pool = self._inference_pools.get(name)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=self.inference_threads, thread_name_prefix=f"infer-{name}")
+            self._inference_pools[name] = pool
+        return pool
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "preprocess_workers": self.preprocess_workers,
+            "preprocess_max_pending": self.preprocess_max_pending,
+            "preprocess_in_flight": self._preprocess_pending,
+            "inference_threads_per_model": self.inference_threads,
+        }
+
+    def shutdown(self) -> None:
+        if self._preprocess_pool is not None:
+            self._preprocess_pool.shutdown(wait=False, cancel_futures=True)
+            self._preprocess_pool = None
+        for pool in self._inference_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._inference_pools.clear()
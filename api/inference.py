@@ -0,0 +1,124 @@
+# inference.py
+import logging
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger("agri-api")
+
+DEFAULT_BATCH_BUCKETS = (1, 2, 4, 8, 16)
+
+
+class KerasEngine:
+    """Plain `model.predict` (the original serving path), kept for comparison/fallback."""
+
+    def __init__(self, model: Any, input_size: int, name: str = ""):
+        self.model = model
+        self.input_size = input_size
+        self.name = name
+
+    @property
+    def weights(self) -> List[Any]:
+        return self.model.weights
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+    def warmup(self, rounds: int = 1) -> Dict[str, float]:
+        return {}
+
+
+class InferenceEngine:
+    """
+    Serve a Keras model through traced `tf.function`s instead of `model.predict`.
+
+    `model.predict` builds a data adapter and callback list on every call,
+    which is most of the cost for a batch of a few images. Here one concrete
+    function is traced per batch-size bucket with a fixed
+    (bucket, input_size, input_size, 3) float32 signature; incoming batches are
+    zero-padded up to the nearest bucket (and split above the largest), so
+    serving never retraces. `warmup()` runs every bucket once so the first
+    real request doesn't pay for tracing or kernel selection.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        input_size: int,
+        batch_buckets: Sequence[int] = DEFAULT_BATCH_BUCKETS,
+        name: str = "",
+    ):
+        self.model = model
+        self.input_size = int(input_size)
+        self.name = name
+        self.batch_buckets = sorted({int(b) for b in batch_buckets if int(b) > 0}) or [1]
+
+        @tf.function(jit_compile=False, autograph=False)
+        def _forward(x):
+            return model(x, training=False)
+
+        self._concrete = {
+            b: _forward.get_concrete_function(
+                tf.TensorSpec([b, self.input_size, self.input_size, 3], tf.float32)
+            )
+            for b in self.batch_buckets
+        }
+
+    @property
+    def weights(self) -> List[Any]:
+        return self.model.weights
+
+    @property
+    def max_bucket(self) -> int:
+        return self.batch_buckets[-1]
+
+    def bucket_for(self, n: int) -> int:
+        for b in self.batch_buckets:
+            if b >= n:
+                return b
+        return self.max_bucket
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        n = batch.shape[0]
+        outputs = []
+        for start in range(0, n, self.max_bucket):
+            chunk = batch[start:start + self.max_bucket]
+            outputs.append(self._run_bucket(chunk))
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=0)
+
+    def _run_bucket(self, chunk: np.ndarray) -> np.ndarray:
+        k = chunk.shape[0]
+        b = self.bucket_for(k)
+        if b != k:
+            padded = np.zeros((b,) + chunk.shape[1:], dtype=np.float32)
+            padded[:k] = chunk
+            chunk = padded
+        out = self._concrete[b](tf.constant(chunk))
+        return out.numpy()[:k]
+
+    def warmup(self, rounds: int = 1) -> Dict[str, float]:
+        """Run each bucket `rounds` times; returns the first-call latency per bucket (ms)."""
+        first_call_ms = {}
+        for b in self.batch_buckets:
+            x = tf.zeros([b, self.input_size, self.input_size, 3], tf.float32)
+            for i in range(max(1, rounds)):
+                t0 = time.perf_counter()
+                self._concrete[b](x)
+                if i == 0:
+                    first_call_ms[str(b)] = round((time.perf_counter() - t0) * 1000.0, 2)
+        logger.info("Warmed up %s engine (buckets %s): %s ms", self.name, self.batch_buckets, first_call_ms)
+        return first_call_ms
+
+
+ENGINES = ("traced", "keras")
+
+
+def build_engine(kind: str, model: Any, input_size: int, batch_buckets: Sequence[int] = DEFAULT_BATCH_BUCKETS, name: str = ""):
+    if kind == "keras":
+        return KerasEngine(model, input_size, name=name)
+    if kind == "traced":
+        return InferenceEngine(model, input_size, batch_buckets=batch_buckets, name=name)
+    raise ValueError(f"Unknown inference engine {kind!r} (use {'/'.join(ENGINES)})")
@@ -0,0 +1,277 @@
+# inference_server.py
+"""
+Shared inference server: one process holds the models, API workers send it
+preprocessed batches over a unix socket.
+
+    python -m api.inference_server --socket /run/agri/inference.sock
+
+With INFERENCE_SERVER_SOCKET set, api.main's registry loads RemoteEngines
+instead of models, so N uvicorn workers share one copy of the weights (see
+api/serve.py, which starts both). Requests from all workers for the same crop
+go through one MicroBatcher here, so concurrent traffic is batched across
+workers too.
+
+Wire format, both directions: 4-byte big-endian header length, JSON header,
+then `header["nbytes"]` bytes of raw array data (C order).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("agri-api")
+
+_LEN = struct.Struct(">I")
+
+
+# -----------------------
+# socket location
+# -----------------------
+def runtime_dir() -> str:
+    """Per-user directory for the default socket: $XDG_RUNTIME_DIR, else <tmp>/agri-<uid>."""
+    return os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"agri-{os.getuid()}")
+
+
+def default_socket_path() -> str:
+    return os.environ.get("INFERENCE_SERVER_SOCKET") or os.path.join(runtime_dir(), "agri-inference.sock")
+
+
+def ensure_private_dir(path: str) -> None:
+    """Create `path` as 0700; refuse one another user owns or can write to (e.g. pre-created in /tmp)."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise SystemExit(f"{path} is not private to this user; choose another --socket")
+
+
+# -----------------------
+# framing
+# -----------------------
+def encode_frame(header: Dict[str, Any], array: Optional[np.ndarray] = None) -> list:
+    """[length prefix, header, payload] buffers for one frame (payload may be empty)."""
+    payload = b""
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, shape=list(array.shape), dtype=array.dtype.str)
+        payload = memoryview(array).cast("B")
+    header = dict(header, nbytes=len(payload))
+    raw = json.dumps(header).encode()
+    return [_LEN.pack(len(raw)), raw, payload]
+
+
+def decode_array(header: Dict[str, Any], payload: bytes) -> Optional[np.ndarray]:
+    if not header.get("nbytes"):
+        return None
+    return np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    (size,) = _LEN.unpack(await reader.readexactly(_LEN.size))
+    header = json.loads(await reader.readexactly(size))
+    payload = await reader.readexactly(header["nbytes"]) if header.get("nbytes") else b""
+    return header, payload
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if not k:
+            raise ConnectionError("inference server closed the connection")
+        got += k
+    return buf
+
+
+# -----------------------
+# client (API worker side)
+# -----------------------
+class InferenceClient:
+    """Blocking client with one connection per calling thread (the inference executors)."""
+
+    def __init__(self, socket_path: str, timeout_s: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _sock(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_s)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, header: Dict[str, Any], array: Optional[np.ndarray] = None) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        """Send one request and wait for its reply; reconnects once if the server was restarted."""
+        for attempt in (0, 1):
+            try:
+                sock = self._sock()
+                length, raw, payload = encode_frame(header, array)
+                sock.sendall(length + raw)
+                if payload:
+                    sock.sendall(payload)
+                (size,) = _LEN.unpack(_recv_exactly(sock, _LEN.size))
+                reply = json.loads(_recv_exactly(sock, size))
+                payload = _recv_exactly(sock, reply["nbytes"]) if reply.get("nbytes") else b""
+                break
+            except (ConnectionError, FileNotFoundError, socket.timeout):
+                self._drop()
+                if attempt:
+                    raise
+        if not reply.get("ok"):
+            raise RuntimeError(f"inference server: {reply.get('error')}")
+        return reply, decode_array(reply, payload)
+
+
+class RemoteEngine:
+    """Engine interface (predict / warmup) backed by the shared inference server."""
+
+    # weights live in the server process, not in this worker
+    nbytes = 0
+
+    def __init__(self, client: InferenceClient, crop: str, input_size: int):
+        self.client = client
+        self.name = crop
+        self.input_size = input_size
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        _, preds = self.client.call({"op": "predict", "crop": self.name}, np.asarray(batch, dtype=np.float32))
+        return preds
+
+    def warmup(self, rounds: int = 1) -> Dict[str, float]:
+        return {}  # the server warms its engines when it loads them
+
+
+def connect_remote_engine(client: InferenceClient, crop: str, input_size: int) -> Optional[RemoteEngine]:
+    """Ask the server to load `crop`; None if it has no model for it."""
+    reply, _ = client.call({"op": "load", "crop": crop})
+    if not reply.get("loaded"):
+        return None
+    return RemoteEngine(client, crop, input_size)
+
+
+# -----------------------
+# server
+# -----------------------
+def _predict_input(registry, header: Dict[str, Any], payload: bytes) -> np.ndarray:
+    """The request's batch, checked against the crop's model before it joins a shared batch."""
+    crop = header.get("crop")
+    spec = registry.spec(crop) if isinstance(crop, str) else None
+    if spec is None:
+        raise ValueError(f"unknown crop {crop!r}")
+    batch = decode_array(header, payload)
+    expected = (spec.input_size, spec.input_size, 3)
+    if batch is None or batch.ndim != 4 or batch.shape[1:] != expected or len(batch) == 0:
+        got = batch.shape if batch is not None else None
+        raise ValueError(f"{crop} expects float32 (N, {expected[0]}, {expected[1]}, 3) input, got {got}")
+    if batch.dtype != np.float32:
+        raise ValueError(f"{crop} expects float32 input, got {batch.dtype}")
+    return batch
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    from api import main
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                header, payload = await read_frame(reader)
+            except asyncio.IncompleteReadError:
+                return
+            op = header.get("op")
+            reply: Dict[str, Any] = {"ok": True}
+            out = None
+            try:
+                if op == "predict":
+                    batch = _predict_input(main.REGISTRY, header, payload)
+                    batcher = main.get_batcher(header["crop"])
+                    rows = await asyncio.gather(*(batcher.submit(batch[i:i + 1]) for i in range(len(batch))))
+                    out = np.stack(rows)
+                elif op == "load":
+                    entry = await loop.run_in_executor(None, main.REGISTRY.get, header["crop"])
+                    reply["loaded"] = entry is not None
+                    reply["version"] = entry.version if entry is not None else None
+                elif op == "stats":
+                    reply["stats"] = {
+                        "pid": os.getpid(),
+                        "models": main.REGISTRY.stats(),
+                        "batching": {name: b.stats() for name, b in main.BATCHERS.items()},
+                    }
+                elif op != "ping":
+                    raise ValueError(f"unknown op {op!r}")
+            except Exception as e:
+                logger.exception("Inference server request failed: %s", e)
+                reply, out = {"ok": False, "error": str(e)}, None
+            writer.writelines(encode_frame(reply, out))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str) -> None:
+    from api import main
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    main.REGISTRY.preload(main.preload_crops())
+    # only this user may connect: bind with a restrictive umask (no window with
+    # default permissions), then make sure of 0600
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        sock.bind(socket_path)
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    server = await asyncio.start_unix_server(_handle, sock=sock)
+    logger.info("Inference server listening on %s (pid %d)", socket_path, os.getpid())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        main.EXECUTION.shutdown()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=default_socket_path())
+    args = parser.parse_args()
+    if os.path.dirname(os.path.abspath(args.socket)) == runtime_dir():
+        ensure_private_dir(runtime_dir())
+    # this process owns the models: never point its own registry at a server
+    os.environ.pop("INFERENCE_SERVER_SOCKET", None)
+    # the launcher stops us with SIGTERM: shut down like Ctrl-C so the socket file is removed
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
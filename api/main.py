@@ -1,22 +1,39 @@
 # main.py
 import os
+import json
+import time
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import zipfile
+from functools import partial
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Optional, Dict, Any, List, Union
 from dotenv import load_dotenv
 
-import requests
 import numpy as np
-from io import BytesIO
-from PIL import Image
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-
-import tensorflow as tf
-from tensorflow.keras.applications.efficientnet_v2 import preprocess_input
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 
 # local treatments.py (your file)
 from api.treatments import treatments
+from api.treatment_index import TreatmentIndex, etag_matches
+from api.admission import AdmissionController, AdmissionRejected
+from api.batching import BatchQueueFull, MicroBatcher
+from api.executors import ExecutionBackend
+from api.registry import LOADING, MB, MISSING, READY, ModelRegistry, ModelSpec, load_manifest
+from api.inference_server import InferenceClient, connect_remote_engine
+from api.preprocessing import UPLOAD_FORMATS, ImageTooLarge, normalize_into, preprocess_256, preprocess_image, preprocess_rice
+from api.tensors import TensorFormatError, parse_tensor_body, row_digests
+from api.uploads import BodySizeLimitMiddleware, read_upload
+from api.cache import TTLCache, content_digest
+from api.weather import WeatherClient
+from api.prefetch import ForecastPrefetcher
+from api.weather_advice import MAX_DAYS, advise, humidity_rule_message, rain_rule_message
+from api.metrics import MetricsRegistry, RequestTimings, TimingMiddleware
 
 # -----------------------
 # Config + logging
@@ -26,19 +43,91 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("agri-api")
 
 OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY")
-GEOCODE_URL = "http://api.openweathermap.org/geo/1.0/direct"
-FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"  # 5 day / 3 hour
+OPENWEATHER_BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")
+WEATHER_RETRIES = int(os.environ.get("WEATHER_RETRIES", "2"))
+WEATHER_MAX_CONNECTIONS = int(os.environ.get("WEATHER_MAX_CONNECTIONS", "20"))
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", "10000"))
+GEOCODE_TTL_S = float(os.environ.get("GEOCODE_TTL_S", str(7 * 24 * 3600)))
+FORECAST_CACHE_SIZE = int(os.environ.get("FORECAST_CACHE_SIZE", "5000"))
+FORECAST_TTL_S = float(os.environ.get("FORECAST_TTL_S", "1800"))  # served as fresh
+FORECAST_STALE_S = float(os.environ.get("FORECAST_STALE_S", "10800"))  # then served stale while refreshing
+FORECAST_GRID_DEG = float(os.environ.get("FORECAST_GRID_DEG", "0.1"))
+# background refresh of the forecasts requests ask for most (see api/prefetch.py)
+PREFETCH_MAX_CELLS = int(os.environ.get("PREFETCH_MAX_CELLS", "200"))  # 0 disables
+PREFETCH_RATE_PER_MIN = float(os.environ.get("PREFETCH_RATE_PER_MIN", "20"))  # upstream budget
+PREFETCH_LEAD_S = float(os.environ.get("PREFETCH_LEAD_S", "300"))  # refresh this long before expiry
+PREFETCH_INTERVAL_S = float(os.environ.get("PREFETCH_INTERVAL_S", "30"))
+PREFETCH_HALF_LIFE_S = float(os.environ.get("PREFETCH_HALF_LIFE_S", str(12 * 3600)))
+# /predict returns without weather ("weather_status": "pending") if it isn't ready
+# this long after the request arrived; <= 0 always waits for it
+WEATHER_LATENCY_BUDGET_MS = float(os.environ.get("WEATHER_LATENCY_BUDGET_MS", "1500"))
+# POST /weather-advice
+WEATHER_ADVICE_MAX_LOCATIONS = int(os.environ.get("WEATHER_ADVICE_MAX_LOCATIONS", "5000"))
+WEATHER_ADVICE_CONCURRENCY = int(os.environ.get("WEATHER_ADVICE_CONCURRENCY", "20"))  # lookups in flight per request
+
+# micro-batching of /predict inference (see api/batching.py)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.environ.get("BATCH_MAX_QUEUE", "256"))
+
+# upload limits: per image, and per request body (all of /predict/batch)
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MAX_PIXELS = int(os.environ.get("UPLOAD_MAX_PIXELS", "50000000"))  # from the header, before decoding
+REQUEST_MAX_BYTES = int(os.environ.get("REQUEST_MAX_BYTES", str(200 * 1024 * 1024)))  # 0 disables
+
+# /predict/batch limits
+BATCH_MAX_IMAGES = int(os.environ.get("BATCH_MAX_IMAGES", "64"))
+# uncompressed size of all images in a batch zip (each one is capped at UPLOAD_MAX_BYTES)
+BATCH_ZIP_MAX_TOTAL_BYTES = int(os.environ.get("BATCH_ZIP_MAX_TOTAL_BYTES", str(100 * 1024 * 1024)))
+# /predict/tensor: max tensors per body
+TENSOR_MAX_COUNT = int(os.environ.get("TENSOR_MAX_COUNT", "64"))
+
+# per-model admission control: beyond this, /predict answers 429 + Retry-After
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32"))  # 0 disables
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", "2000"))
+# skip the weather lookup once this many requests wait for the same model
+WEATHER_SHED_QUEUE_DEPTH = int(os.environ.get("WEATHER_SHED_QUEUE_DEPTH", "16"))  # 0 never sheds
+
+# repeated uploads: (crop, model version, content hash) -> prediction + treatment
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "2048"))  # 0 disables
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", "3600"))
+
+# /treatment responses: clients may reuse them this long, then revalidate with If-None-Match
+TREATMENT_MAX_AGE_S = int(os.environ.get("TREATMENT_MAX_AGE_S", "3600"))
+
+# where blocking work runs (see api/executors.py)
+EXECUTION = ExecutionBackend(
+    backend=os.environ.get("EXECUTION_BACKEND", "threads"),
+    preprocess_workers=int(os.environ.get("PREPROCESS_WORKERS", "4")),
+    preprocess_max_pending=int(os.environ.get("PREPROCESS_MAX_PENDING", "64")),
+    inference_threads=int(os.environ.get("INFERENCE_THREADS_PER_MODEL", "1")),
+)
 
 # -----------------------
 # FastAPI app + CORS
 # -----------------------
-app = FastAPI(title="AgriAid - Disease Detection API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # models load in the background (in parallel) so /ping answers right away; see /ready
+    REGISTRY.preload(preload_crops(), wait=False)
+    PREFETCHER.start()
+    yield
+    await PREFETCHER.stop()
+    await WEATHER.aclose()
+    EXECUTION.shutdown()
+
+
+app = FastAPI(title="AgriAid - Disease Detection API", lifespan=lifespan)
+# added first = innermost: CORS wraps it, so its 413s still carry the CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=REQUEST_MAX_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # tighten in production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Cache", "ETag"],
 )
 
 # -----------------------
@@ -53,6 +142,8 @@ def load_model_safe(path: str):
         if not os.path.exists(path):
             logger.warning("Model file not found: %s", path)
             return None
+        import tensorflow as tf  # deferred: importing TF takes seconds, keep it off the startup path
+
         model = tf.keras.models.load_model(path)
         logger.info("Loaded model: %s", path)
         return model
@@ -61,15 +152,33 @@ def load_model_safe(path: str):
         return None
 
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-# saved_models folder inside api
-MODEL_DIR = os.path.join(BASE_DIR, "saved_models")
+# saved_models folder inside api (override with MODEL_DIR)
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(BASE_DIR, "saved_models"))
+# optional JSON manifest adding/overriding crops (see api/registry.py)
+MODEL_MANIFEST = os.environ.get("MODEL_MANIFEST", os.path.join(MODEL_DIR, "models.json"))
+# 0 = unlimited; otherwise least-recently-used models are evicted above this
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+# comma separated crops to load in the background at startup ("all" for every registered crop)
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "all")
+# models loading in parallel; a failed / missing model is retried at most this often
+MODEL_LOAD_WORKERS = int(os.environ.get("MODEL_LOAD_WORKERS", "4"))
+MODEL_LOAD_RETRY_S = float(os.environ.get("MODEL_LOAD_RETRY_S", "60"))
+# "traced" (tf.function per batch bucket, warmed up at load) or "keras" (model.predict)
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "traced")
+INFERENCE_BATCH_BUCKETS = [int(b) for b in os.environ.get("INFERENCE_BATCH_BUCKETS", "1,2,4,8,16").split(",") if b.strip()]
+INFERENCE_WARMUP_ROUNDS = int(os.environ.get("INFERENCE_WARMUP_ROUNDS", "2"))
+# per-crop backend overrides, e.g. "rice=tflite-int8,potato=tflite-dynamic"
+# (traced / keras / tflite / tflite-dynamic / tflite-int8)
+MODEL_BACKENDS = dict(
+    item.strip().lower().split("=", 1) for item in os.environ.get("MODEL_BACKENDS", "").split(",") if "=" in item
+)
+TFLITE_THREADS = int(os.environ.get("TFLITE_THREADS", "2"))
+TFLITE_SAVE_CONVERTED = os.environ.get("TFLITE_SAVE_CONVERTED", "0") == "1"
+# images for int8 calibration: <dir>/<crop>/*.jpg
+TFLITE_CALIBRATION_DIR = os.environ.get("TFLITE_CALIBRATION_DIR")
+# multi-worker mode: models live in one shared inference server (see api/serve.py)
+INFERENCE_SERVER_SOCKET = os.environ.get("INFERENCE_SERVER_SOCKET")
 
-POTATO_MODEL = load_model_safe(os.path.join(MODEL_DIR, "potato_v1.keras"))
-TOMATO_MODEL = load_model_safe(os.path.join(MODEL_DIR, "tomato_v1.keras"))
-PEPPER_MODEL = load_model_safe(os.path.join(MODEL_DIR, "pepper_v1.keras"))
-RICE_MODEL = load_model_safe(os.path.join(MODEL_DIR, "rice_v1.keras"))
 # -----------------------
 # Class labels (must match training order)
 # -----------------------
@@ -102,110 +211,603 @@ RICE_CLASSES = [
 ]
 
 # -----------------------
-# Image preprocessing helpers
+# Model registry (loaded in the background, LRU under MODEL_MEMORY_BUDGET_MB)
+# -----------------------
+def backend_for(spec: ModelSpec) -> str:
+    return MODEL_BACKENDS.get(spec.crop) or spec.backend or INFERENCE_ENGINE
+
+
+def calibration_samples(spec: ModelSpec) -> list:
+    if not TFLITE_CALIBRATION_DIR:
+        return []
+    from api.tflite_engine import load_sample_inputs
+
+    return load_sample_inputs(
+        os.path.join(TFLITE_CALIBRATION_DIR, spec.crop),
+        lambda b: preprocess_image(b, spec.input_size, spec.preprocessing),
+    )
+
+
+def load_engine(spec: ModelSpec):
+    """Load a crop's model and wrap it in its configured inference backend (warmed up)."""
+    backend = backend_for(spec)
+    try:
+        if INFERENCE_CLIENT is not None:
+            return connect_remote_engine(INFERENCE_CLIENT, spec.crop, spec.input_size)
+        if backend.startswith("tflite"):
+            from api.tflite_engine import load_tflite_engine
+
+            engine = load_tflite_engine(
+                spec.path,
+                spec.input_size,
+                quantization=backend.partition("-")[2] or "none",
+                load_keras=load_model_safe,
+                calibration_fn=lambda: calibration_samples(spec),
+                save_converted=TFLITE_SAVE_CONVERTED,
+                num_threads=TFLITE_THREADS,
+                batch_buckets=INFERENCE_BATCH_BUCKETS,
+                name=spec.crop,
+            )
+        else:
+            from api.inference import build_engine
+
+            model = load_model_safe(spec.path)
+            if model is None:
+                return None
+            engine = build_engine(backend, model, spec.input_size, INFERENCE_BATCH_BUCKETS, name=spec.crop)
+        if engine is None:
+            return None
+        engine.warmup(INFERENCE_WARMUP_ROUNDS)
+        return engine
+    except Exception as e:
+        logger.exception("Failed to build %s engine for %s: %s", backend, spec.crop, e)
+        return None
+
+
+INFERENCE_CLIENT = InferenceClient(INFERENCE_SERVER_SOCKET) if INFERENCE_SERVER_SOCKET else None
+
+REGISTRY = ModelRegistry(
+    load_fn=load_engine,
+    memory_budget_bytes=int(MODEL_MEMORY_BUDGET_MB * MB),
+    load_workers=MODEL_LOAD_WORKERS,
+    retry_after_s=MODEL_LOAD_RETRY_S,
+)
+REGISTRY.register(ModelSpec("potato", os.path.join(MODEL_DIR, "potato_v1.keras"), POTATO_CLASSES))
+REGISTRY.register(ModelSpec("tomato", os.path.join(MODEL_DIR, "tomato_v1.keras"), TOMATO_CLASSES))
+REGISTRY.register(ModelSpec("pepper", os.path.join(MODEL_DIR, "pepper_v1.keras"), PEPPER_CLASSES))
+REGISTRY.register(
+    ModelSpec("rice", os.path.join(MODEL_DIR, "rice_v1.keras"), RICE_CLASSES, input_size=224, preprocessing="efficientnet")
+)
+if os.path.exists(MODEL_MANIFEST):
+    for _spec in load_manifest(MODEL_MANIFEST, MODEL_DIR):
+        REGISTRY.register(_spec)
+
+# treatments.py indexed once against every registered crop's classes
+TREATMENTS = TreatmentIndex(treatments, {crop: REGISTRY.spec(crop).classes for crop in REGISTRY.crops})
+
+
+# -----------------------
+# Prediction result cache
+# -----------------------
+PREDICTION_CACHE = TTLCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
+
+
+def _invalidate_predictions(crop: str, entry) -> None:
+    # every (re)load may bring new weights, so nothing cached for this crop is trusted
+    dropped = PREDICTION_CACHE.invalidate(lambda key: key[0] == crop)
+    if dropped:
+        logger.info("Dropped %d cached predictions for reloaded model %s", dropped, crop)
+
+
+REGISTRY.add_listener(_invalidate_predictions)
+
+
+def preload_crops() -> list:
+    if MODEL_PRELOAD.strip().lower() == "all":
+        return REGISTRY.crops
+    return [c.strip().lower() for c in MODEL_PRELOAD.split(",") if c.strip()]
+
+
+# -----------------------
+# Per-model batching queues
+# -----------------------
+BATCHERS: Dict[str, MicroBatcher] = {}
+
+
+def get_batcher(crop: str) -> MicroBatcher:
+    batcher = BATCHERS.get(crop)
+    if batcher is None:
+
+        def predict_fn(batch: np.ndarray) -> np.ndarray:
+            # look the model up per batch so an evicted model is transparently reloaded
+            entry = REGISTRY.get(crop)
+            if entry is None:
+                raise RuntimeError(f"Model for '{crop}' is not available")
+            return entry.model.predict(batch)
+
+        batcher = MicroBatcher(
+            crop,
+            predict_fn,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_queue=BATCH_MAX_QUEUE,
+            executor=EXECUTION.inference_executor(crop),
+            max_concurrent_batches=EXECUTION.inference_threads,
+        )
+        BATCHERS[crop] = batcher
+    return batcher
+
+
+# -----------------------
+# Per-model admission control
 # -----------------------
-def preprocess_256(img_bytes: bytes) -> np.ndarray:
-    img = Image.open(BytesIO(img_bytes)).convert("RGB")
-    img = img.resize((256, 256))
-    arr = np.array(img).astype(np.float32) / 255.0
-    arr = np.expand_dims(arr, 0)
-    return arr
+ADMISSION: Dict[str, AdmissionController] = {}
 
 
-def preprocess_rice(img_bytes: bytes) -> np.ndarray:
-    img = Image.open(BytesIO(img_bytes)).convert("RGB")
-    img = img.resize((224, 224))
-    arr = np.array(img).astype(np.float32)
-    arr = np.expand_dims(arr, 0)
-    arr = preprocess_input(arr)  # EfficientNet preprocessing
-    return arr
+def get_admission(crop: str) -> AdmissionController:
+    controller = ADMISSION.get(crop)
+    if controller is None:
+        controller = AdmissionController(
+            crop,
+            max_concurrency=ADMISSION_MAX_CONCURRENCY,
+            max_queue=ADMISSION_MAX_QUEUE,
+            queue_timeout_ms=ADMISSION_QUEUE_TIMEOUT_MS,
+            shed_queue_depth=WEATHER_SHED_QUEUE_DEPTH,
+        )
+        ADMISSION[crop] = controller
+    return controller
+
+
+def should_shed_weather(crops) -> bool:
+    """True when any of `crops` (known ones only) is backed up past WEATHER_SHED_QUEUE_DEPTH."""
+    return any(get_admission(c).shed_enrichment() for c in set(crops) if REGISTRY.spec(c) is not None)
 
 
 # -----------------------
 # Weather helpers
 # -----------------------
-_geocode_cache: Dict[str, Dict[str, float]] = {}
+WEATHER = WeatherClient(
+    OPENWEATHER_API_KEY,
+    base_url=OPENWEATHER_BASE_URL,
+    retries=WEATHER_RETRIES,
+    max_connections=WEATHER_MAX_CONNECTIONS,
+    geocode_cache_size=GEOCODE_CACHE_SIZE,
+    geocode_ttl_s=GEOCODE_TTL_S,
+    forecast_cache_size=FORECAST_CACHE_SIZE,
+    forecast_ttl_s=FORECAST_TTL_S,
+    forecast_stale_s=FORECAST_STALE_S,
+    forecast_grid_deg=FORECAST_GRID_DEG,
+)
+PREFETCHER = ForecastPrefetcher(
+    WEATHER,
+    max_cells=PREFETCH_MAX_CELLS,
+    rate_per_min=PREFETCH_RATE_PER_MIN,
+    lead_s=PREFETCH_LEAD_S,
+    interval_s=PREFETCH_INTERVAL_S,
+    half_life_s=PREFETCH_HALF_LIFE_S,
+)
 
 
-def geocode_location(location: str) -> Optional[Dict[str, float]]:
-    """Return {'lat': float, 'lon': float} or None. Uses OpenWeather geocoding."""
-    if not OPENWEATHER_API_KEY:
+async def geocode_location(location: str) -> Optional[Dict[str, float]]:
+    """Return {'lat': float, 'lon': float} or None. Uses OpenWeather geocoding (cached)."""
+    return await WEATHER.geocode(location)
+
+
+async def fetch_5day_forecast(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """5 day / 3 hour forecast for the FORECAST_GRID_DEG cell containing lat, lon (cached)."""
+    return await WEATHER.forecast(lat, lon)
+
+
+def parse_lat_lon(location: str) -> Optional[Dict[str, float]]:
+    """'19.07,72.87' -> {'lat': 19.07, 'lon': 72.87}; None for place names."""
+    if "," not in location:
         return None
-    key = location.strip().lower()
-    if key in _geocode_cache:
-        return _geocode_cache[key]
-    params = {"q": location, "limit": 1, "appid": OPENWEATHER_API_KEY}
     try:
-        r = requests.get(GEOCODE_URL, params=params, timeout=8)
-        r.raise_for_status()
-        data = r.json()
-        if not data:
+        lat_s, lon_s = location.split(",")
+        return {"lat": float(lat_s.strip()), "lon": float(lon_s.strip())}
+    except Exception:
+        return None
+
+
+async def lookup_weather(location: str, timings: Optional[RequestTimings] = None) -> Optional[Dict[str, Any]]:
+    """Resolve `location` and fetch its forecast; None if either step fails. Never raises."""
+    timings = timings or RequestTimings()
+    try:
+        loc_coords = parse_lat_lon(location)
+        if not loc_coords:
+            with timings.stage("geocode"):
+                loc_coords = await geocode_location(location)
+        if not loc_coords:
             return None
-        lat = float(data[0]["lat"])
-        lon = float(data[0]["lon"])
-        _geocode_cache[key] = {"lat": lat, "lon": lon}
-        return {"lat": lat, "lon": lon}
-    except Exception as e:
-        logger.warning("Geocode failed for %s: %s", location, e)
+        PREFETCHER.observe(loc_coords["lat"], loc_coords["lon"])
+        with timings.stage("forecast"):
+            forecast_json = await fetch_5day_forecast(loc_coords["lat"], loc_coords["lon"])
+        return {"coords": loc_coords, "forecast": forecast_json}
+    except Exception:
+        logger.exception("Weather lookup failed for %s", location)
         return None
 
 
-def fetch_5day_forecast(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    if not OPENWEATHER_API_KEY:
+SHED = "shed"  # stands in for the weather task when the lookup was skipped under load
+
+
+def start_weather_lookup(location: Optional[str], timings: Optional[RequestTimings] = None, shed: bool = False):
+    """Kick off the weather lookup so it runs alongside preprocessing and inference."""
+    if not location:
         return None
-    params = {"lat": lat, "lon": lon, "units": "metric", "appid": OPENWEATHER_API_KEY}
+    if shed:
+        return SHED
+    return asyncio.get_running_loop().create_task(lookup_weather(location, timings))
+
+
+def cancel_weather_lookup(task) -> None:
+    """Drop the lookup of a request that failed (upstream calls other requests share keep running)."""
+    if isinstance(task, asyncio.Task):
+        task.cancel()
+
+
+async def await_weather(task, deadline: float):
+    """
+    Wait for a weather lookup until `deadline` (loop time).
+
+    Returns (lookup result or None, status) with status one of "ok",
+    "unavailable", "pending" (budget ran out; the lookup keeps running in the
+    background and warms the forecast cache), "shed" (skipped because the
+    model was overloaded) or None when no location was given.
+    """
+    if task is None:
+        return None, None
+    if task is SHED:
+        return None, SHED
+    if WEATHER_LATENCY_BUDGET_MS > 0 and not task.done():
+        remaining = deadline - asyncio.get_running_loop().time()
+        await asyncio.wait({task}, timeout=max(0.0, remaining))
+        if not task.done():
+            return None, "pending"
+    result = await task
+    return result, ("ok" if result and result["forecast"] else "unavailable")
+
+
+def apply_disease_weather_rules(weather_summary: Dict[str, Any], disease_rules: Dict[str, Any]) -> None:
+    """Override the generic recommendation with disease-specific thresholds, if any."""
+    try:
+        rain_th = disease_rules.get("heavy_rain_mm")
+        hum_th = disease_rules.get("humidity_high_pct")
+        if rain_th is not None and weather_summary.get("rain_mm") is not None:
+            if weather_summary["rain_mm"] >= rain_th:
+                weather_summary["recommendation"] = rain_rule_message(rain_th)
+        if hum_th is not None and weather_summary.get("avg_humidity") is not None:
+            if weather_summary["avg_humidity"] >= hum_th:
+                weather_summary["recommendation"] = humidity_rule_message(hum_th)
+    except Exception:
+        # don't crash due to unexpected structure
+        logger.exception("Error applying disease-specific weather rules")
+
+
+def analyze_forecast_and_recommend(forecast_json: dict, days: int = 3) -> Dict[str, Any]:
+    """Rain total, peak rain chance, mean humidity and generic spray advice over the next `days`."""
+    summary = advise([forecast_json], [days])[0][0]
+    summary.pop("days")
+    return summary
+
+
+# -----------------------
+# Prediction pipeline (shared by /predict and /predict/batch)
+# -----------------------
+async def resolve_model(crop_type: str):
+    """
+    Return (spec, loaded model) for a crop. Never waits for a load: a model
+    that isn't loaded yet is loaded in the background and the request gets a
+    503 with Retry-After.
+    """
+    spec = REGISTRY.spec(crop_type)
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Invalid crop_type (use {'/'.join(REGISTRY.crops)})")
+    entry = REGISTRY.peek(crop_type)
+    if entry is not None:
+        return spec, entry
+    state = REGISTRY.load_in_background(crop_type)
+    if state == LOADING:
+        raise HTTPException(status_code=503, detail=f"Model for '{crop_type}' is loading, retry shortly.",
+                            headers={"Retry-After": str(MODEL_LOADING_RETRY_AFTER_S)})
+    if state == MISSING:
+        # helpful message — model not present on server
+        raise HTTPException(status_code=500, detail=f"Model for '{crop_type}' not available on server. Add model file to saved_models/.")
+    raise HTTPException(status_code=500, detail=f"Model for '{crop_type}' failed to load; see /ready.")
+
+
+MODEL_LOADING_RETRY_AFTER_S = 5
+
+
+def lookup_treatment(crop_type: str, predicted_class: str) -> Dict[str, Any]:
+    """Stored treatment for a predicted class (safe access)."""
+    return TREATMENTS.for_class(crop_type, predicted_class)
+
+
+async def classify(spec: ModelSpec, entry, img_bytes: bytes, timings: Optional[RequestTimings] = None) -> Dict[str, Any]:
+    """Predicted class, confidence and treatment for one image (served from the prediction cache when possible)."""
+    crop_type = spec.crop
+    timings = timings or RequestTimings()
+
+    def timer(stage: str):
+        return timings.stage(stage, crop=crop_type)
+
+    # the same photo for the same model version: skip decode + inference
+    with timer("digest"):
+        digest = await EXECUTION.run_preprocess(content_digest, img_bytes)
+    cache_key = (crop_type, entry.version, digest)
+    cached = PREDICTION_CACHE.get(cache_key)
+    if cached is not None:
+        predicted_class, confidence, treatment_info = cached
+        return {"predicted_class": predicted_class, "confidence": confidence, "treatment_info": treatment_info, "cached": True}
+
+    # cache misses hold one of the model's admission slots for decode + inference
+    admission = get_admission(crop_type)
+    try:
+        with timer("admission"):
+            await admission.acquire()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending requests for '{crop_type}', retry shortly.",
+                            headers={"Retry-After": str(e.retry_after_s)})
+    started = time.perf_counter()
+    try:
+        predicted_class, confidence = await _predict_uncached(spec, img_bytes, timer)
+    finally:
+        admission.release(time.perf_counter() - started)
+
+    with timer("treatment"):
+        treatment_info = lookup_treatment(crop_type, predicted_class)
+    PREDICTION_CACHE.set(cache_key, (predicted_class, confidence, treatment_info))
+    return {"predicted_class": predicted_class, "confidence": confidence, "treatment_info": treatment_info, "cached": False}
+
+
+async def _predict_uncached(spec: ModelSpec, img_bytes: bytes, timer):
+    crop_type = spec.crop
+    # decode + resize off the event loop; oversized / unexpected formats fail on the header
+    decode = partial(preprocess_image, timer=timer, max_pixels=UPLOAD_MAX_PIXELS, formats=UPLOAD_FORMATS)
+    try:
+        img_batch = await EXECUTION.run_preprocess(decode, img_bytes, spec.input_size, spec.preprocessing)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.warning("Could not decode upload for %s: %s", crop_type, e)
+        raise HTTPException(status_code=400, detail="Could not read image file")
+
+    # run prediction (batched with other in-flight requests for the same model)
     try:
-        r = requests.get(FORECAST_URL, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        with timer("inference"):  # includes the wait for a batch slot
+            preds = await get_batcher(crop_type).submit(img_batch)
+        idx = int(np.argmax(preds))
+        return spec.classes[idx], float(np.max(preds))
+    except BatchQueueFull:
+        raise HTTPException(status_code=429, detail=f"Too many pending requests for '{crop_type}', retry shortly.",
+                            headers={"Retry-After": "1"})
     except Exception as e:
-        logger.warning("Forecast fetch failed for %s,%s: %s", lat, lon, e)
+        logger.exception("Prediction failed: %s", e)
+        raise HTTPException(status_code=500, detail="Model prediction failed")
+
+
+async def classify_tensors(spec: ModelSpec, entry, pixels: np.ndarray, timings: Optional[RequestTimings] = None) -> List[Dict[str, Any]]:
+    """
+    classify() for already-resized uint8 (N, H, W, 3) tensors: no decode or
+    resize, and the cache misses are normalized together in one pass under a
+    single admission slot.
+    """
+    crop_type = spec.crop
+    timings = timings or RequestTimings()
+
+    def timer(stage: str):
+        return timings.stage(stage, crop=crop_type)
+
+    with timer("digest"):
+        digests = await EXECUTION.run_preprocess(row_digests, pixels)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(digests)
+    misses = []
+    for i, digest in enumerate(digests):
+        cached = PREDICTION_CACHE.get((crop_type, entry.version, digest))
+        if cached is None:
+            misses.append(i)
+            continue
+        predicted_class, confidence, treatment_info = cached
+        results[i] = {"predicted_class": predicted_class, "confidence": confidence, "treatment_info": treatment_info, "cached": True}
+    if not misses:
+        return results
+
+    admission = get_admission(crop_type)
+    try:
+        with timer("admission"):
+            await admission.acquire()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending requests for '{crop_type}', retry shortly.",
+                            headers={"Retry-After": str(e.retry_after_s)})
+    started = time.perf_counter()
+    try:
+        predictions = await _predict_tensors(spec, pixels if len(misses) == len(digests) else pixels[misses], timer)
+    finally:
+        admission.release(time.perf_counter() - started)
+
+    with timer("treatment"):
+        for i, (predicted_class, confidence) in zip(misses, predictions):
+            treatment_info = lookup_treatment(crop_type, predicted_class)
+            PREDICTION_CACHE.set((crop_type, entry.version, digests[i]), (predicted_class, confidence, treatment_info))
+            results[i] = {"predicted_class": predicted_class, "confidence": confidence, "treatment_info": treatment_info, "cached": False}
+    return results
+
+
+async def _predict_tensors(spec: ModelSpec, pixels: np.ndarray, timer):
+    crop_type = spec.crop
+    with timer("normalize"):
+        batch = np.empty(pixels.shape, dtype=np.float32)
+        await EXECUTION.run_preprocess(normalize_into, pixels, spec.preprocessing, batch)
+    try:
+        with timer("inference"):
+            batcher = get_batcher(crop_type)
+            preds = await asyncio.gather(*(batcher.submit(batch[i:i + 1]) for i in range(len(batch))))
+        return [(spec.classes[int(np.argmax(p))], float(np.max(p))) for p in preds]
+    except BatchQueueFull:
+        raise HTTPException(status_code=429, detail=f"Too many pending requests for '{crop_type}', retry shortly.",
+                            headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.exception("Prediction failed: %s", e)
+        raise HTTPException(status_code=500, detail="Model prediction failed")
+
+
+def summarize_weather(weather: Optional[Dict[str, Any]], treatment_info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """3-day spray advice for a lookup_weather() result, with the disease's weather_rules applied."""
+    if not weather:
         return None
+    loc_coords = weather["coords"]
+    weather_summary = analyze_forecast_and_recommend(weather["forecast"], days=3)
+    weather_summary["lat"] = loc_coords["lat"]
+    weather_summary["lon"] = loc_coords["lon"]
+    # disease-specific override (if weather_rules exist)
+    disease_rules = treatment_info.get("weather_rules", {}) if isinstance(treatment_info, dict) else {}
+    apply_disease_weather_rules(weather_summary, disease_rules or {})
+    return weather_summary
 
 
-def analyze_forecast_and_recommend(forecast_json: dict, days: int = 3) -> Dict[str, Any]:
-    if not forecast_json or "list" not in forecast_json:
-        return {"rain_mm": None, "max_pop": None, "avg_humidity": None, "recommendation": "No weather data."}
-    entries = forecast_json["list"]
-    entries_needed = min(len(entries), days * 8)
-    entries = entries[:entries_needed]
-
-    rain_sum = 0.0
-    pops = []
-    hums = []
-
-    for ent in entries:
-        # rain in 3-hour bucket
-        if "rain" in ent:
-            rain_sum += float(ent["rain"].get("3h", 0.0))
-        pop = ent.get("pop")
-        if pop is not None:
-            pops.append(float(pop))
-        hum = ent.get("main", {}).get("humidity")
-        if hum is not None:
-            hums.append(float(hum))
-
-    max_pop = max(pops) if pops else None
-    avg_humidity = (sum(hums) / len(hums)) if hums else None
-
-    # simple rules
-    if rain_sum >= 10:
-        recommendation = (
-            f"Heavy rain (~{rain_sum:.1f} mm over next {days} days). Chemical sprays may wash off; recommend waiting 3–4 days."
-        )
-    elif max_pop is not None and max_pop >= 0.6:
-        recommendation = f"High chance of rain (peak {max_pop:.0%}). Prefer organic or delay chemical spray."
-    elif avg_humidity is not None and avg_humidity >= 85:
-        recommendation = f"Very high humidity (~{avg_humidity:.0f}%) — conditions favor disease. Consider preventive treatment."
-    else:
-        recommendation = "Weather suitable for application now."
+def read_batch_archive(data: bytes, default_crop: Optional[str], max_images: int = BATCH_MAX_IMAGES) -> List[Dict[str, Any]]:
+    """
+    Images from a zip upload. The crop comes from the top-level folder
+    ("rice/IMG_001.jpg") when it names a registered crop, else `default_crop`.
 
-    return {
-        "rain_mm": round(rain_sum, 2),
-        "max_pop": round(max_pop, 2) if max_pop is not None else None,
-        "avg_humidity": round(avg_humidity, 1) if avg_humidity is not None else None,
-        "recommendation": recommendation,
-    }
+    Blocking (inflates the entries); run it off the event loop. Counts and
+    sizes are checked against the zip's directory before anything is
+    inflated: an image over UPLOAD_MAX_BYTES gets an error item, and more than
+    BATCH_ZIP_MAX_TOTAL_BYTES in all is refused with 413. The declared sizes
+    can lie, so every read is bounded as well.
+    """
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        entries = []
+        for info in zf.infolist():
+            base = info.filename.rsplit("/", 1)[-1]
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+                continue
+            entries.append(info)
+        if len(entries) > max_images:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IMAGES} images per batch")
+        declared = sum(info.file_size for info in entries if info.file_size <= UPLOAD_MAX_BYTES)
+        if declared > BATCH_ZIP_MAX_TOTAL_BYTES:
+            raise HTTPException(status_code=413, detail=f"Archive images larger than {BATCH_ZIP_MAX_TOTAL_BYTES} bytes in total")
+
+        items = []
+        total = 0
+        for info in entries:
+            name = info.filename
+            parts = name.split("/")
+            crop = parts[0].lower() if len(parts) > 1 and REGISTRY.spec(parts[0].lower()) else default_crop
+            item = {"filename": name, "crop_type": crop}
+            if info.file_size > UPLOAD_MAX_BYTES:
+                item["error"] = f"File larger than {UPLOAD_MAX_BYTES} bytes"
+                items.append(item)
+                continue
+            with zf.open(info) as f:
+                content = f.read(UPLOAD_MAX_BYTES + 1)
+            total += len(content)
+            if total > BATCH_ZIP_MAX_TOTAL_BYTES:
+                raise HTTPException(status_code=413, detail=f"Archive images larger than {BATCH_ZIP_MAX_TOTAL_BYTES} bytes in total")
+            if len(content) > UPLOAD_MAX_BYTES:
+                item["error"] = f"File larger than {UPLOAD_MAX_BYTES} bytes"
+            else:
+                item["bytes"] = content
+            items.append(item)
+    return items
+
+
+async def classify_group(crop_type: str, items: List[Dict[str, Any]], timings: Optional[RequestTimings] = None) -> List[Dict[str, Any]]:
+    """Classify every image of one crop; the batcher turns them into batched forward passes."""
+    try:
+        spec, entry = await resolve_model(crop_type)
+    except HTTPException as e:
+        return [{"type": "error", "index": it["index"], "filename": it["filename"], "crop_type": crop_type, "error": e.detail} for it in items]
+
+    results = await asyncio.gather(*(classify(spec, entry, it["bytes"], timings) for it in items), return_exceptions=True)
+    lines = []
+    for it, res in zip(items, results):
+        line = {"index": it["index"], "filename": it["filename"], "crop_type": crop_type}
+        if isinstance(res, HTTPException):
+            line.update(type="error", error=res.detail)
+        elif isinstance(res, Exception):
+            logger.exception("Batch prediction failed for %s", it["filename"], exc_info=res)
+            line.update(type="error", error="Model prediction failed")
+        else:
+            line.update(type="prediction", **res)
+        lines.append(line)
+    return lines
+
+
+# -----------------------
+# Metrics (Prometheus text format on /metrics, Server-Timing on every response)
+# -----------------------
+METRICS = MetricsRegistry()
+REQUEST_LATENCY = METRICS.histogram(
+    "agri_request_duration_seconds", "Request latency until the response starts.", ("endpoint", "crop", "outcome"))
+REQUESTS = METRICS.counter("agri_requests_total", "Requests served.", ("endpoint", "crop", "outcome"))
+STAGE_LATENCY = METRICS.histogram(
+    "agri_stage_duration_seconds",
+    "Time spent per pipeline stage (upload_read, digest, admission, decode, resize, normalize, inference, treatment, geocode, forecast, advice).",
+    ("stage", "crop"))
+METRICS.gauge("agri_batch_queue_depth", "Images waiting for a forward pass.",
+              lambda: {(name,): b.queue_depth for name, b in BATCHERS.items()}, ("crop",))
+METRICS.gauge("agri_admission_in_flight", "Predictions holding an admission slot.",
+              lambda: {(name,): a.in_flight for name, a in ADMISSION.items()}, ("crop",))
+METRICS.gauge("agri_admission_waiting", "Predictions waiting for an admission slot.",
+              lambda: {(name,): a.waiting for name, a in ADMISSION.items()}, ("crop",))
+METRICS.gauge("agri_admission_rejected_total", "Predictions rejected with 429 (queue full or wait timed out).",
+              lambda: {(name,): a.rejected + a.timed_out for name, a in ADMISSION.items()}, ("crop",), kind="counter")
+METRICS.gauge("agri_weather_shed_total", "Weather lookups skipped because the model was overloaded.",
+              lambda: {(name,): a.shed for name, a in ADMISSION.items()}, ("crop",), kind="counter")
+METRICS.gauge("agri_model_ready", "1 when the crop's model is loaded and serving.",
+              lambda: {(crop,): float(s["state"] == READY) for crop, s in REGISTRY.states().items()}, ("crop",))
+METRICS.gauge("agri_model_resident_bytes", "Estimated memory held by loaded models.",
+              lambda: {(): REGISTRY.resident_bytes})
+METRICS.gauge("agri_prediction_cache_hits_total", "Prediction cache hits.",
+              lambda: {(): PREDICTION_CACHE.hits}, kind="counter")
+METRICS.gauge("agri_prediction_cache_misses_total", "Prediction cache misses.",
+              lambda: {(): PREDICTION_CACHE.misses}, kind="counter")
+METRICS.gauge("agri_weather_upstream_calls_total", "OpenWeather HTTP calls (including retries).",
+              lambda: {(): WEATHER.upstream_calls}, kind="counter")
+METRICS.gauge("agri_forecast_lookups_total", "Request-path forecast lookups by how they were answered.",
+              lambda: {("fresh",): WEATHER.fresh_hits, ("stale",): WEATHER.stale_served, ("fetched",): WEATHER.request_fetches},
+              ("result",), kind="counter")
+METRICS.gauge("agri_forecast_prefetch_hits_total", "Fresh forecast lookups answered by a prefetched entry.",
+              lambda: {(): WEATHER.prefetch_hits}, kind="counter")
+METRICS.gauge("agri_forecast_prefetch_refreshes_total", "Forecasts fetched by the prefetcher.",
+              lambda: {(): PREFETCHER.refreshes}, kind="counter")
+
+
+def outcome_for(status: int) -> str:
+    if status < 400:
+        return "ok"
+    if status in (429, 503):
+        return "overloaded"
+    return "client_error" if status < 500 else "server_error"
+
+
+def _observe_stage(stage: str, seconds: float, labels: Dict[str, str]) -> None:
+    STAGE_LATENCY.observe(seconds, stage, labels.get("crop", ""))
+
+
+def _observe_request(scope: dict, status: int, seconds: float, timings: RequestTimings) -> None:
+    route = scope.get("route")
+    endpoint = getattr(route, "path", None) or "unmatched"  # route template, keeps label cardinality bounded
+    crop = timings.labels.get("crop", "")
+    outcome = timings.labels.get("outcome") if status < 400 else None
+    outcome = outcome or outcome_for(status)
+    REQUEST_LATENCY.observe(seconds, endpoint, crop, outcome)
+    REQUESTS.inc(endpoint, crop, outcome)
+
+
+app.add_middleware(TimingMiddleware, on_complete=_observe_request, on_record=_observe_stage)
+
+
+def request_timings(request: Request) -> RequestTimings:
+    return getattr(request.state, "timings", None) or RequestTimings()
+
+
+def crop_label(crop_type: Optional[str]) -> str:
+    """Metrics label for a crop named by the client: registered crops only, so clients can't mint series."""
+    return crop_type if crop_type and REGISTRY.spec(crop_type) is not None else "unknown"
 
 
 # -----------------------
@@ -216,8 +818,59 @@ async def ping():
     return {"message": "server active"}
 
 
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Readiness probe: 200 once the load of every model scheduled at startup
+    has finished (ready, or definitively missing/failed), 503 while any is
+    still on its first attempt. A model evicted under the memory budget
+    afterwards doesn't count as loading. Per-crop states are in the body
+    either way.
+    """
+    models = REGISTRY.states()
+    waiting = [crop for crop in preload_crops() if crop in models and not REGISTRY.attempted(crop)]
+    serving = [crop for crop, s in models.items() if s["state"] == READY]
+    is_ready = not waiting
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "loading": waiting, "serving": serving, "models": models}
+
+
+@app.get("/stats")
+async def stats():
+    """Executor load, loaded models and per-model admission and batching stats, for tuning."""
+    return {
+        "execution": EXECUTION.stats(),
+        "models": REGISTRY.stats(),
+        "prediction_cache": PREDICTION_CACHE.stats(),
+        "weather": WEATHER.stats(),
+        "prefetch": PREFETCHER.stats(),
+        "admission": {name: a.stats() for name, a in ADMISSION.items()},
+        "batching": {name: b.stats() for name, b in BATCHERS.items()},
+        "inference_server": await inference_server_stats(),
+    }
+
+
+async def inference_server_stats() -> Optional[Dict[str, Any]]:
+    if INFERENCE_CLIENT is None:
+        return None
+    try:
+        reply, _ = await asyncio.get_running_loop().run_in_executor(None, INFERENCE_CLIENT.call, {"op": "stats"})
+        return dict(reply["stats"], socket=INFERENCE_SERVER_SOCKET)
+    except Exception as e:
+        return {"socket": INFERENCE_SERVER_SOCKET, "error": str(e)}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: per-stage and per-request latency histograms, counters and gauges."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/predict")
 async def predict(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
     crop_type: str = Form(...),
     location: Optional[str] = Form(None),  # optional: lat,lon or city/district
@@ -227,109 +880,287 @@ async def predict(
     location can be "city", "city, country" OR "lat,lon" (e.g. "19.07,72.87").
     """
 
+    timings = request_timings(request)
     crop_type = crop_type.strip().lower()
-    img_bytes = await file.read()
-
-    # pick model + preprocessing
-    if crop_type == "potato":
-        model = POTATO_MODEL
-        class_names = POTATO_CLASSES
-        img_batch = preprocess_256(img_bytes)
-    elif crop_type == "tomato":
-        model = TOMATO_MODEL
-        class_names = TOMATO_CLASSES
-        img_batch = preprocess_256(img_bytes)
-    elif crop_type == "pepper":
-        model = PEPPER_MODEL
-        class_names = PEPPER_CLASSES
-        img_batch = preprocess_256(img_bytes)
-    elif crop_type == "rice":
-        model = RICE_MODEL
-        class_names = RICE_CLASSES
-        img_batch = preprocess_rice(img_bytes)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid crop_type (use potato/tomato/pepper/rice)")
-
-    if model is None:
-        # helpful message — model not present on server
-        raise HTTPException(status_code=500, detail=f"Model for '{crop_type}' not available on server. Add model file to saved_models/ and restart.")
+    timings.labels["crop"] = crop_label(crop_type)
+    weather_deadline = asyncio.get_running_loop().time() + WEATHER_LATENCY_BUDGET_MS / 1000.0
 
-    # run prediction
+    with timings.stage("upload_read"):
+        img_bytes = await read_upload(file, UPLOAD_MAX_BYTES)
+    spec, entry = await resolve_model(crop_type)
+
+    # weather runs concurrently with the prediction, under WEATHER_LATENCY_BUDGET_MS,
+    # unless the model is backed up (then it is shed to keep capacity for the prediction)
+    weather_task = start_weather_lookup(location, timings, shed=bool(location) and should_shed_weather([crop_type]))
     try:
-        preds = model.predict(img_batch)
-        idx = int(np.argmax(preds[0]))
-        confidence = float(np.max(preds[0]))
-        predicted_class = class_names[idx]
-    except Exception as e:
-        logger.exception("Prediction failed: %s", e)
-        raise HTTPException(status_code=500, detail="Model prediction failed")
+        result = await classify(spec, entry, img_bytes, timings)
+    except BaseException:
+        cancel_weather_lookup(weather_task)
+        raise
+    response.headers["X-Cache"] = "HIT" if result["cached"] else "MISS"
+    timings.labels["outcome"] = "cache_hit" if result["cached"] else "ok"
 
-    # lookup treatment (safe access)
-    disease_key = predicted_class.strip().lower().replace(" ", "_")
-    treatment_info = {"organic": [], "chemical": []}
-    crop_dict = treatments.get(crop_type, {}) if isinstance(treatments, dict) else {}
-    if isinstance(crop_dict, dict) and disease_key in crop_dict and isinstance(crop_dict[disease_key], dict):
-        treatment_info = crop_dict[disease_key]
-
-    # weather analysis (optional)
-    weather_summary = None
-    if location:
-        # try lat,lon input first
-        loc_coords = None
-        if "," in location:
-            try:
-                lat_s, lon_s = location.split(",")
-                loc_coords = {"lat": float(lat_s.strip()), "lon": float(lon_s.strip())}
-            except Exception:
-                loc_coords = None
-        if loc_coords is None:
-            loc_coords = geocode_location(location)
-        if loc_coords:
-            forecast_json = fetch_5day_forecast(loc_coords["lat"], loc_coords["lon"])
-            weather_summary = analyze_forecast_and_recommend(forecast_json, days=3)
-            weather_summary["lat"] = loc_coords["lat"]
-            weather_summary["lon"] = loc_coords["lon"]
-            # disease-specific override (if weather_rules exist)
-            disease_rules = {}
-            if isinstance(crop_dict, dict) and disease_key in crop_dict and isinstance(crop_dict[disease_key], dict):
-                disease_rules = crop_dict[disease_key].get("weather_rules", {})
-            # apply disease thresholds if provided
+    # weather analysis (optional; started when the request arrived)
+    weather, weather_status = await await_weather(weather_task, weather_deadline)
+
+    return {
+        "crop_type": crop_type,
+        "predicted_class": result["predicted_class"],
+        "confidence": result["confidence"],
+        "treatment_info": result["treatment_info"],
+        "weather_forecast": summarize_weather(weather, result["treatment_info"]),
+        "weather_status": weather_status,
+        "cached": result["cached"],
+    }
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    crop_type: Optional[List[str]] = Form(None),  # one per file, or a single one for all
+    location: Optional[str] = Form(None),
+):
+    """
+    Predict many images in one request, as repeated 'files' parts and/or one
+    zip 'archive' (crop taken from its top-level folder names, else from
+    'crop_type'). Images are grouped per crop model and run as batches.
+
+    Streams NDJSON: one {"type": "prediction"|"error", "index", ...} line per
+    image as each crop group finishes, then one {"type": "weather"} line. The
+    weather lookup for 'location' runs once for the whole batch.
+    """
+    timings = request_timings(request)
+    weather_deadline = asyncio.get_running_loop().time() + WEATHER_LATENCY_BUDGET_MS / 1000.0
+
+    crops = [c.strip().lower() for c in (crop_type or [])]
+    files = files or []
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="Send images as 'files' and/or a zip 'archive'")
+    # before any part is read: the parser has spooled them, reading copies them into memory
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IMAGES} images per batch")
+    if files and len(crops) not in (1, len(files)):
+        raise HTTPException(status_code=400, detail="Give one crop_type per file, or a single crop_type for all")
+    default_crop = crops[0] if len(crops) == 1 else None
+    if default_crop:
+        timings.labels["crop"] = crop_label(default_crop)
+
+    items: List[Dict[str, Any]] = []
+    with timings.stage("upload_read"):
+        for i, f in enumerate(files):
+            item = {"filename": f.filename, "crop_type": crops[i] if len(crops) > 1 else default_crop}
             try:
-                rain_th = disease_rules.get("heavy_rain_mm")
-                hum_th = disease_rules.get("humidity_high_pct")
-                if rain_th is not None and weather_summary.get("rain_mm") is not None:
-                    if weather_summary["rain_mm"] >= rain_th:
-                        weather_summary["recommendation"] = (
-                            f"Based on disease-specific rule (rain >= {rain_th} mm) heavy rain expected; delay chemical spraying."
-                        )
-                if hum_th is not None and weather_summary.get("avg_humidity") is not None:
-                    if weather_summary["avg_humidity"] >= hum_th:
-                        weather_summary["recommendation"] = (
-                            f"Based on disease-specific rule (humidity >= {hum_th}%) high humidity detected; consider preventive steps."
-                        )
-            except Exception:
-                # don't crash due to unexpected structure
-                logger.exception("Error applying disease-specific weather rules")
-
-    response = {
+                item["bytes"] = await read_upload(f, UPLOAD_MAX_BYTES)
+            except HTTPException as e:
+                item["error"] = e.detail  # one oversized photo doesn't fail the batch
+            items.append(item)
+        archive_bytes = await read_upload(archive, REQUEST_MAX_BYTES) if archive is not None else None
+    if archive is not None:
+        try:
+            items.extend(await EXECUTION.run_preprocess(
+                read_batch_archive, archive_bytes, default_crop, BATCH_MAX_IMAGES - len(items)))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="archive is not a valid zip file")
+
+    # group by crop model; anything unroutable is reported straight away
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    early_lines = []
+    for index, it in enumerate(items):
+        it["index"] = index
+        if "error" in it:
+            early_lines.append({"type": "error", "index": index, "filename": it["filename"], "crop_type": it["crop_type"], "error": it["error"]})
+        elif not it["crop_type"] or REGISTRY.spec(it["crop_type"]) is None:
+            early_lines.append({"type": "error", "index": index, "filename": it["filename"], "crop_type": it["crop_type"],
+                                "error": f"Invalid crop_type (use {'/'.join(REGISTRY.crops)})"})
+        else:
+            groups.setdefault(it["crop_type"], []).append(it)
+    # nothing to advise on when no image is usable
+    weather_task = start_weather_lookup(location if groups else None, timings,
+                                        shed=bool(location) and should_shed_weather(groups))
+
+    async def stream():
+        tasks = [asyncio.create_task(classify_group(crop, group, timings)) for crop, group in groups.items()]
+        seen = {}
+        try:
+            for line in early_lines:
+                yield json.dumps(line) + "\n"
+            for next_group in asyncio.as_completed(tasks):
+                for line in await next_group:
+                    if line["type"] == "prediction":
+                        seen[(line["crop_type"], line["predicted_class"])] = line["treatment_info"]
+                    yield json.dumps(line) + "\n"
+
+            weather, weather_status = await await_weather(weather_task, weather_deadline)
+            disease_advice = []
+            if weather:
+                for (crop, predicted_class), treatment_info in seen.items():
+                    summary = summarize_weather(weather, treatment_info)
+                    disease_advice.append({"crop_type": crop, "predicted_class": predicted_class, "recommendation": summary["recommendation"]})
+            yield json.dumps({
+                "type": "weather",
+                "weather_status": weather_status,
+                "weather_forecast": summarize_weather(weather),
+                "disease_advice": disease_advice,
+            }) + "\n"
+        finally:
+            # client went away: don't keep running its inference
+            for t in tasks:
+                t.cancel()
+            cancel_weather_lookup(weather_task)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/predict/tensor")
+async def predict_tensor(request: Request, response: Response, location: Optional[str] = None):
+    """
+    Predict from raw uint8 RGB tensors the client already resized to the
+    model's input size (body format in api/tensors.py), one or many per body.
+    Optional `location` query parameter as for /predict.
+    """
+    timings = request_timings(request)
+    weather_deadline = asyncio.get_running_loop().time() + WEATHER_LATENCY_BUDGET_MS / 1000.0
+    with timings.stage("upload_read"):
+        body = await request.body()
+    try:
+        tensors = parse_tensor_body(body, TENSOR_MAX_COUNT)
+    except TensorFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    crop_type = tensors.crop
+    timings.labels["crop"] = crop_label(crop_type)
+
+    spec = REGISTRY.spec(crop_type)
+    if spec is not None:
+        _, height, width, channels = tensors.pixels.shape
+        if (height, width, channels) != (spec.input_size, spec.input_size, 3):
+            raise HTTPException(
+                status_code=400,
+                detail=f"'{crop_type}' expects {spec.input_size}x{spec.input_size}x3 tensors, got {height}x{width}x{channels}",
+            )
+
+    spec, entry = await resolve_model(crop_type)
+    weather_task = start_weather_lookup(location, timings, shed=bool(location) and should_shed_weather([crop_type]))
+    try:
+        results = await classify_tensors(spec, entry, tensors.pixels, timings)
+    except BaseException:
+        cancel_weather_lookup(weather_task)
+        raise
+    all_cached = all(r["cached"] for r in results)
+    response.headers["X-Cache"] = "HIT" if all_cached else "MISS"
+    timings.labels["outcome"] = "cache_hit" if all_cached else "ok"
+
+    weather, weather_status = await await_weather(weather_task, weather_deadline)
+    return {
         "crop_type": crop_type,
-        "predicted_class": predicted_class,
-        "confidence": confidence,
-        "treatment_info": treatment_info,
-        "weather_forecast": weather_summary,
+        "count": len(results),
+        "results": [
+            {"index": i, **r, "weather_forecast": summarize_weather(weather, r["treatment_info"])}
+            for i, r in enumerate(results)
+        ],
+        "weather_status": weather_status,
     }
-    return response
 
 
 @app.get("/treatment/{predicted_class}")
-async def get_treatment(predicted_class: str):
-    """Return stored treatment info for a disease key (case-insensitive)."""
-    disease_key = predicted_class.strip().lower().replace(" ", "_")
-    if not isinstance(treatments, dict):
-        raise HTTPException(status_code=500, detail="Treatments data not available")
-    for crop_name, crop_map in treatments.items():
-        if not isinstance(crop_map, dict):
-            continue
-        if disease_key in crop_map and isinstance(crop_map[disease_key], dict):
-            return {"disease": predicted_class, "treatment_info": crop_map[disease_key]}
-    raise HTTPException(status_code=404, detail="Treatment not found")
+async def get_treatment(request: Request, predicted_class: str, crop_type: Optional[str] = None):
+    """Return stored treatment info for a disease key (case-insensitive), 304 if the client's copy is current."""
+    entry = TREATMENTS.find(predicted_class, crop_type.strip().lower() if crop_type else None)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Treatment not found")
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={TREATMENT_MAX_AGE_S}"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+class AdviceLocation(BaseModel):
+    location: str  # place name or "lat,lon"
+    id: Optional[str] = None  # caller's plot id, echoed back
+    crop_type: Optional[str] = None
+    disease: Optional[str] = None  # class label or treatment key; its weather_rules apply
+
+
+class WeatherAdviceRequest(BaseModel):
+    locations: List[Union[str, AdviceLocation]]
+    horizons_days: List[int] = [3]
+    # defaults for locations that don't set their own
+    crop_type: Optional[str] = None
+    disease: Optional[str] = None
+
+
+@app.post("/weather-advice")
+async def weather_advice(request: Request, body: WeatherAdviceRequest):
+    """Spray advice for many locations over one or more horizons (days ahead)."""
+    timings = request_timings(request)
+    if not body.locations:
+        raise HTTPException(status_code=400, detail="No locations given")
+    if len(body.locations) > WEATHER_ADVICE_MAX_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {WEATHER_ADVICE_MAX_LOCATIONS} locations per request")
+    horizons = body.horizons_days
+    if not horizons or any(not 1 <= d <= MAX_DAYS for d in horizons):
+        raise HTTPException(status_code=400, detail=f"horizons_days must be between 1 and {MAX_DAYS}")
+    if not WEATHER.enabled:
+        raise HTTPException(status_code=503, detail="Weather service not configured")
+
+    plots = [AdviceLocation(location=p) if isinstance(p, str) else p for p in body.locations]
+    # disease -> weather_rules, resolved once per distinct (crop, disease)
+    resolved: Dict[Any, Optional[Dict[str, Any]]] = {}
+    plot_rules = []
+    for p in plots:
+        crop = (p.crop_type or body.crop_type or "").strip().lower() or None
+        disease = p.disease or body.disease
+        if disease and (crop, disease) not in resolved:
+            entry = TREATMENTS.find(disease, crop)
+            if entry is None:
+                raise HTTPException(status_code=400, detail=f"Unknown disease '{disease}'" + (f" for crop '{crop}'" if crop else ""))
+            resolved[(crop, disease)] = entry.treatment.get("weather_rules") or None
+        plot_rules.append(resolved[(crop, disease)] if disease else None)
+
+    # one lookup per distinct location, a bounded number at a time
+    keys = [" ".join(p.location.lower().split()) for p in plots]
+    unique = list(dict.fromkeys(keys))
+    sem = asyncio.Semaphore(max(1, WEATHER_ADVICE_CONCURRENCY))
+
+    async def lookup(location: str):
+        async with sem:
+            return await lookup_weather(location, timings)
+
+    looked_up = dict(zip(unique, await asyncio.gather(*(lookup(k) for k in unique))))
+
+    # plots in the same forecast grid cell share one forecast object: summarise
+    # each (forecast, rules) pair once, then fan the rows back out
+    forecasts, rules, index, slots = [], [], [], {}
+    for key, r in zip(keys, plot_rules):
+        weather = looked_up[key]
+        fc = weather["forecast"] if weather else None
+        slot = slots.get((id(fc), id(r)))
+        if slot is None:
+            slot = slots[(id(fc), id(r))] = len(forecasts)
+            forecasts.append(fc)
+            rules.append(r)
+        index.append(slot)
+    with timings.stage("advice"):
+        rows = await asyncio.get_running_loop().run_in_executor(None, advise, forecasts, horizons, rules)
+
+    results = []
+    for p, key, slot in zip(plots, keys, index):
+        weather = looked_up[key]
+        item = {"location": p.location}
+        if p.id is not None:
+            item["id"] = p.id
+        item.update(
+            lat=weather["coords"]["lat"] if weather else None,
+            lon=weather["coords"]["lon"] if weather else None,
+            status="ok" if forecasts[slot] else "unavailable",
+            advice=rows[slot],
+        )
+        results.append(item)
+    # plain JSONResponse: skips FastAPI's per-field encoding of thousands of rows
+    return JSONResponse({
+        "horizons_days": horizons,
+        "unique_locations": len(unique),
+        "unique_forecasts": len({id(fc) for fc in forecasts if fc}),
+        "results": results,
+    })
@@ -0,0 +1,212 @@
+# metrics.py
+"""
+Minimal Prometheus-format metrics and per-request stage timers.
+
+Kept dependency-free and cheap enough to leave on in production: a metric
+update is a dict lookup, a bisect and two additions under a lock.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# seconds; covers a cache hit (~100us) up to a slow upstream weather call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, labels, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Value(s) read at scrape time from `fn`, which returns {label values tuple: value}.
+    `kind="counter"` exposes a monotonic count kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], Dict[Tuple[str, ...], float]],
+                 labels: Iterable[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.fn().items()):
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Dict[Tuple[str, ...], float]],
+              labels: Iterable[str] = (), kind: str = "gauge") -> Gauge:
+        return self._add(Gauge(name, help_text, fn, labels, kind))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                continue  # a broken gauge callback must not break the scrape
+        return "\n".join(lines) + "\n"
+
+
+# -----------------------
+# per-request stage timers
+# -----------------------
+class RequestTimings:
+    """
+    Durations of the named stages of one request (summed when a stage runs
+    more than once, e.g. per image of a batch). Safe to record from worker
+    threads.
+
+    `labels` describe the request (crop, outcome) and are filled in by the
+    handler. Each recorded stage is also passed to `on_record(stage, seconds,
+    labels)` right away, so stages of streamed responses reach the histograms
+    even though their header went out first.
+    """
+
+    def __init__(self, on_record: Optional[Callable[[str, float, Dict[str, str]], None]] = None):
+        self.stages: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+        self.on_record = on_record
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, **labels: str) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.on_record is not None:
+            self.on_record(stage, seconds, dict(self.labels, **labels) if labels else self.labels)
+
+    @contextmanager
+    def stage(self, name: str, **labels: str):
+        """Time the body of a `with` block as stage `name` (labels override the request's)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0, **labels)
+
+    def server_timing(self, total_s: Optional[float] = None) -> str:
+        with self._lock:
+            parts = [f"{name};dur={secs * 1000.0:.2f}" for name, secs in self.stages.items()]
+        if total_s is not None:
+            parts.append(f"total;dur={total_s * 1000.0:.2f}")
+        return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware: gives every HTTP request a RequestTimings
+    (`request.state.timings`), adds a `Server-Timing` header with its stages,
+    and hands (scope, status, total seconds, timings) to `on_complete` once
+    the response has started (time to first byte for streamed responses).
+    """
+
+    def __init__(self, app, on_complete: Callable[[dict, int, float, RequestTimings], None], on_record=None):
+        self.app = app
+        self.on_complete = on_complete
+        self.on_record = on_record
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings(self.on_record)
+        scope.setdefault("state", {})["timings"] = timings
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - t0
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(total).encode("latin-1")))
+                message = dict(message, headers=headers)
+                try:
+                    self.on_complete(scope, message["status"], total, timings)
+                except Exception:
+                    pass
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,183 @@
+# prefetch.py
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from api.weather import WeatherClient
+
+logger = logging.getLogger("agri-api")
+
+Cell = Tuple[float, float]
+
+
+class TokenBucket:
+    """`rate_per_s` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate_per_s: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_s = max(0.0, rate_per_s)
+        self.capacity = max(1.0, capacity)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def take(self) -> bool:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+
+class ForecastPrefetcher:
+    """
+    Keeps the forecasts of busy locations warm so requests rarely wait on OpenWeather.
+
+    `observe(lat, lon)` is called for every location a request resolves
+    (coordinates or geocoded names) and bumps its forecast grid cell's
+    popularity, an exponentially decaying count (`half_life_s`), so yesterday
+    morning's districts are still hot before today's first request. Every
+    `interval_s` the `max_cells` hottest cells with a score of at least
+    `min_score` are checked, and those whose cached forecast is missing or
+    due to expire within `lead_s` are fetched again, most urgent first. The
+    upstream calls this makes are capped by a token bucket of
+    `rate_per_min` (bursts up to `burst`).
+    """
+
+    def __init__(
+        self,
+        weather: WeatherClient,
+        max_cells: int = 200,
+        rate_per_min: float = 20.0,
+        burst: int = 10,
+        lead_s: float = 300.0,
+        interval_s: float = 30.0,
+        half_life_s: float = 12 * 3600.0,
+        min_score: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.weather = weather
+        self.max_cells = int(max_cells)
+        self.lead_s = lead_s
+        self.interval_s = max(1.0, interval_s)
+        self.half_life_s = max(1.0, half_life_s)
+        self.min_score = min_score
+        self.budget = TokenBucket(rate_per_min / 60.0, burst, clock=clock)
+        self._clock = clock
+        # cell -> (score, time of last update)
+        self._scores: Dict[Cell, Tuple[float, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # stats
+        self.observed = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.deferred = 0  # due refreshes left for a later tick by the rate budget
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_cells > 0 and self.weather.enabled
+
+    # -----------------------
+    # popularity
+    # -----------------------
+    def _decayed(self, score: float, since: float, now: float) -> float:
+        return score * math.pow(0.5, (now - since) / self.half_life_s)
+
+    def observe(self, lat: float, lon: float) -> None:
+        """Count one request for the location's forecast cell. Cheap; called on the request path."""
+        if not self.enabled:
+            return
+        cell = self.weather.forecast_cell(lat, lon)
+        now = self._clock()
+        score, since = self._scores.get(cell, (0.0, now))
+        self._scores[cell] = (self._decayed(score, since, now) + 1.0, now)
+        self.observed += 1
+
+    def hot_cells(self) -> List[Tuple[Cell, float]]:
+        """The `max_cells` most popular cells (score >= min_score), hottest first."""
+        now = self._clock()
+        scored = [(cell, self._decayed(s, t, now)) for cell, (s, t) in self._scores.items()]
+        hot = sorted((item for item in scored if item[1] >= self.min_score), key=lambda item: -item[1])
+        # forget cells that have gone cold, and keep the table bounded
+        keep = {cell for cell, score in scored if score >= self.min_score / 8}
+        if len(keep) > 10 * self.max_cells:
+            keep = {cell for cell, _ in sorted(scored, key=lambda item: -item[1])[: 10 * self.max_cells]}
+        if len(keep) < len(self._scores):
+            self._scores = {cell: v for cell, v in self._scores.items() if cell in keep}
+        return hot[: self.max_cells]
+
+    # -----------------------
+    # scheduling
+    # -----------------------
+    def due(self) -> List[Cell]:
+        """Hot cells whose forecast is missing or expires within `lead_s`, most urgent first."""
+        fresh_for = []
+        for cell, score in self.hot_cells():
+            age = self.weather.forecast_age(cell)
+            remaining = -math.inf if age is None else self.weather.forecast_ttl_s - age
+            if remaining <= self.lead_s:
+                fresh_for.append((remaining, -score, cell))
+        fresh_for.sort()
+        return [cell for _, _, cell in fresh_for]
+
+    async def tick(self) -> int:
+        """Refresh what is due within the rate budget; returns how many refreshes ran."""
+        batch = []
+        due = self.due()
+        for cell in due:
+            if not self.budget.take():
+                self.deferred += len(due) - len(batch)
+                break
+            batch.append(cell)
+        if not batch:
+            return 0
+        results = await asyncio.gather(*(self.weather.refresh_forecast(cell) for cell in batch), return_exceptions=True)
+        self.refreshes += len(batch)
+        self.refresh_failures += sum(1 for ok in results if ok is not True)
+        return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Forecast prefetch tick failed")
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        w = self.weather
+        lookups = w.fresh_hits + w.stale_served + w.request_fetches
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "tracked_cells": len(self._scores),
+            "max_cells": self.max_cells,
+            "rate_per_min": round(self.budget.rate_per_s * 60.0, 2),
+            "observed": self.observed,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "deferred": self.deferred,
+            # share of request-path forecast lookups answered by an entry the prefetcher fetched
+            "prefetch_hit_rate": round(w.prefetch_hits / lookups, 4) if lookups else None,
+            "request_fetch_rate": round(w.request_fetches / lookups, 4) if lookups else None,
+            "upstream_calls": w.upstream_calls,
+        }
@@ -0,0 +1,119 @@
+# preprocessing.py
+from contextlib import nullcontext
+from io import BytesIO
+from typing import Callable, ContextManager, Iterable, Optional
+
+import numpy as np
+from PIL import Image
+
+# Pillow resizes in stages (cheap box reduce, then bicubic) when the source is
+# this many times larger than the target; 3.0 is visually indistinguishable
+# from a single full-resolution bicubic pass.
+RESIZE_REDUCING_GAP = 3.0
+
+_MAX_PIXEL = np.float32(255.0)
+
+# formats a leaf photo can arrive in; others (EPS, PSD, ...) are never handed to their decoders
+UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP", "BMP", "TIFF", "GIF")
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more pixels than allowed (possible decompression bomb)."""
+
+
+def decode(
+    img_bytes: bytes,
+    size: int,
+    max_pixels: Optional[int] = None,
+    formats: Optional[Iterable[str]] = None,
+) -> Image.Image:
+    """
+    Decode an upload to RGB, no smaller than `size` on each side.
+
+    For JPEGs, `draft` asks libjpeg to decode at 1/2, 1/4 or 1/8 scale (DCT
+    scaling) while staying at least `size` on each side, so a 12 MP phone photo
+    is never fully decoded. Other formats are reduced in stages by `resize`.
+
+    Only the header is parsed before the checks: a format outside `formats`
+    fails to open, and more than `max_pixels` raises ImageTooLarge, both
+    before any pixel data is decoded.
+    """
+    try:
+        img = Image.open(BytesIO(img_bytes), formats=formats)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from e
+    if max_pixels and img.width * img.height > max_pixels:
+        raise ImageTooLarge(f"{img.width}x{img.height} image is over the {max_pixels} pixel limit")
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    img.load()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def resize(img: Image.Image, size: int) -> Image.Image:
+    return img.resize((size, size), Image.BICUBIC, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def decode_resized(img_bytes: bytes, size: int) -> Image.Image:
+    """Decode an upload straight to an RGB `size` x `size` image."""
+    return resize(decode(img_bytes, size), size)
+
+
+def normalize_into(pixels: np.ndarray, preprocessing: str, out: np.ndarray) -> np.ndarray:
+    """
+    Write uint8 HxWx3 `pixels` into float32 `out` in one pass.
+
+    - "rescale": x / 255 (the 256x256 potato/tomato/pepper CNNs)
+    - "efficientnet": raw 0..255 floats. keras' EfficientNetV2
+      `preprocess_input` is a pass-through because the model rescales
+      internally, so no extra pass is needed.
+    """
+    if preprocessing == "rescale":
+        np.divide(pixels, _MAX_PIXEL, out=out, dtype=np.float32)
+    else:
+        np.copyto(out, pixels, casting="unsafe")
+    return out
+
+
+def preprocess_image(
+    img_bytes: bytes,
+    size: int,
+    preprocessing: str = "rescale",
+    out: Optional[np.ndarray] = None,
+    timer: Optional[Callable[[str], ContextManager]] = None,
+    max_pixels: Optional[int] = None,
+    formats: Optional[Iterable[str]] = None,
+) -> np.ndarray:
+    """
+    Decode + resize + normalize an upload into a (1, size, size, 3) float32 batch.
+
+    Pass `out` (any float32 array of shape (size, size, 3) or (1, size, size, 3),
+    e.g. one row of a larger batch) to write into a preallocated buffer.
+    `timer(stage)` (e.g. RequestTimings.stage) is entered around the "decode"
+    and "resize" (resize + normalize) steps. `max_pixels` / `formats` are
+    checked against the header, see `decode`.
+    """
+    if out is None:
+        out = np.empty((1, size, size, 3), dtype=np.float32)
+    if timer is None:
+        timer = _no_timer
+    with timer("decode"):
+        img = decode(img_bytes, size, max_pixels, formats)
+    with timer("resize"):
+        img = resize(img, size)
+        normalize_into(np.asarray(img), preprocessing, out[0] if out.ndim == 4 else out)
+    return out
+
+
+def _no_timer(stage: str) -> ContextManager:
+    return nullcontext()
+
+
+def preprocess_256(img_bytes: bytes) -> np.ndarray:
+    return preprocess_image(img_bytes, 256, "rescale")
+
+
+def preprocess_rice(img_bytes: bytes) -> np.ndarray:
+    return preprocess_image(img_bytes, 224, "efficientnet")
@@ -0,0 +1,352 @@
+# registry.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("agri-api")
+
+PREPROCESSING_MODES = ("rescale", "efficientnet")
+MB = 1024 * 1024
+
+# per-crop load states
+UNLOADED = "unloaded"  # registered, not loaded yet (or evicted)
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"  # load_fn raised or returned None for an existing file
+MISSING = "missing"  # model file not found
+
+
+@dataclass
+class ModelSpec:
+    """Everything needed to load and serve one crop's model."""
+
+    crop: str
+    path: str
+    classes: List[str]
+    input_size: int = 256
+    preprocessing: str = "rescale"  # "rescale" (x / 255) or "efficientnet" (raw 0..255)
+    backend: Optional[str] = None  # inference backend override, e.g. "tflite-int8"
+
+    def __post_init__(self):
+        if self.preprocessing not in PREPROCESSING_MODES:
+            raise ValueError(f"{self.crop}: unknown preprocessing {self.preprocessing!r}")
+
+
+@dataclass
+class LoadedModel:
+    spec: ModelSpec
+    model: Any
+    size_bytes: int
+    version: str
+    loaded_at: float = field(default_factory=time.time)
+
+
+def file_version(path: str) -> str:
+    """Cheap identity for a model file: changes whenever the file is replaced."""
+    try:
+        st = os.stat(path)
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    except OSError:
+        return "unknown"
+
+
+def estimate_model_bytes(model: Any, path: Optional[str] = None) -> int:
+    """Resident size of a model's weights, falling back to the file size on disk."""
+    nbytes = getattr(model, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    try:
+        total = 0
+        for w in model.weights:
+            total += int(np.prod(w.shape)) * np.dtype(w.dtype).itemsize
+        if total:
+            return total
+    except Exception:
+        pass
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return 0
+
+
+def load_manifest(path: str, model_dir: str) -> List[ModelSpec]:
+    """
+    Read extra/overriding model specs from a JSON manifest, e.g.
+
+        {"maize": {"file": "maize_v1.keras", "classes": ["rust", "healthy"],
+                   "input_size": 256, "preprocessing": "rescale", "backend": "tflite"}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    specs = []
+    for crop, cfg in data.items():
+        specs.append(
+            ModelSpec(
+                crop=crop.strip().lower(),
+                path=os.path.join(model_dir, cfg["file"]),
+                classes=list(cfg["classes"]),
+                input_size=int(cfg.get("input_size", 256)),
+                preprocessing=cfg.get("preprocessing", "rescale"),
+                backend=cfg.get("backend"),
+            )
+        )
+    return specs
+
+
+class ModelRegistry:
+    """
+    Crop name -> model, loaded on first use and kept under a memory budget.
+
+    `load_fn(spec)` returns a model or None (file missing / broken). Loaded
+    models are kept in LRU order; when the total estimated size goes over
+    `memory_budget_bytes` the least recently used ones are evicted. A per-crop
+    lock makes concurrent first requests for the same crop wait for a single
+    load instead of each loading their own copy.
+
+    Listeners added with `add_listener(fn)` are called as `fn(crop, entry)`
+    after every (re)load, e.g. to drop results cached for an older version.
+
+    Every crop has a load state (UNLOADED, LOADING, READY, FAILED, MISSING).
+    `load_in_background(crop)` starts a load on a pool of `load_workers`
+    threads and returns at once, so several models load in parallel while
+    the server keeps answering; a FAILED / MISSING crop is retried at most
+    every `retry_after_s`.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[ModelSpec], Any],
+        memory_budget_bytes: Optional[int] = None,
+        size_fn: Callable[[Any, Optional[str]], int] = estimate_model_bytes,
+        load_workers: int = 4,
+        retry_after_s: float = 60.0,
+    ):
+        self.load_fn = load_fn
+        self.memory_budget_bytes = memory_budget_bytes or None
+        self.size_fn = size_fn
+        self.load_workers = max(1, int(load_workers))
+        self.retry_after_s = retry_after_s
+        self._loader: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        # crop -> {"state", "error", "load_s", "attempted_at", "attempts"}
+        self._status: Dict[str, Dict[str, Any]] = {}
+
+        self._specs: Dict[str, ModelSpec] = {}
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._listeners: List[Callable[[str, LoadedModel], None]] = []
+
+        # stats
+        self.loads = 0
+        self.evictions = 0
+
+    # -----------------------
+    # specs
+    # -----------------------
+    def register(self, spec: ModelSpec) -> None:
+        with self._lock:
+            self._specs[spec.crop] = spec
+            self._load_locks.setdefault(spec.crop, threading.Lock())
+            self._status.setdefault(spec.crop, {"state": UNLOADED})
+
+    def add_listener(self, fn: Callable[[str, LoadedModel], None]) -> None:
+        self._listeners.append(fn)
+
+    def spec(self, crop: str) -> Optional[ModelSpec]:
+        return self._specs.get(crop)
+
+    @property
+    def crops(self) -> List[str]:
+        return list(self._specs)
+
+    # -----------------------
+    # loading
+    # -----------------------
+    def peek(self, crop: str) -> Optional[LoadedModel]:
+        """Return the loaded model (marking it recently used) without loading."""
+        with self._lock:
+            entry = self._loaded.get(crop)
+            if entry is not None:
+                self._loaded.move_to_end(crop)
+            return entry
+
+    def get(self, crop: str) -> Optional[LoadedModel]:
+        """Return the model for `crop`, loading it if needed. Blocking."""
+        entry = self.peek(crop)
+        if entry is not None:
+            return entry
+        spec = self._specs.get(crop)
+        if spec is None:
+            return None
+        with self._load_locks[crop]:
+            # someone else may have finished loading while we waited
+            entry = self.peek(crop)
+            if entry is not None:
+                return entry
+            return self._load(spec)
+
+    def _load(self, spec: ModelSpec) -> Optional[LoadedModel]:
+        self._set_status(spec.crop, LOADING, attempted_at=time.time())
+        version = file_version(spec.path)
+        t0 = time.perf_counter()
+        try:
+            model = self.load_fn(spec)
+            error = None
+        except Exception as e:
+            logger.exception("Loading model %s failed: %s", spec.crop, e)
+            model, error = None, str(e)
+        load_s = round(time.perf_counter() - t0, 3)
+        if model is None:
+            state = MISSING if not os.path.exists(spec.path) else FAILED
+            self._set_status(spec.crop, state, error=error or ("model file not found" if state == MISSING else "load failed"),
+                             load_s=load_s, attempts=self._status[spec.crop].get("attempts", 0) + 1)
+            return None
+        entry = LoadedModel(spec=spec, model=model, size_bytes=self.size_fn(model, spec.path), version=version)
+        with self._lock:
+            self._loaded[spec.crop] = entry
+            self._loaded.move_to_end(spec.crop)
+            self.loads += 1
+            status = self._status[spec.crop]
+            status.update(state=READY, error=None, load_s=load_s, attempts=status.get("attempts", 0) + 1)
+            self._enforce_budget(keep=spec.crop)
+        logger.info("Model %s ready (%.1f MB, version %s)", spec.crop, entry.size_bytes / MB, version)
+        for fn in self._listeners:
+            try:
+                fn(spec.crop, entry)
+            except Exception:
+                logger.exception("Model load listener failed for %s", spec.crop)
+        return entry
+
+    def _enforce_budget(self, keep: str) -> None:
+        # caller holds self._lock
+        if not self.memory_budget_bytes:
+            return
+        while self.resident_bytes > self.memory_budget_bytes:
+            victim = next((c for c in self._loaded if c != keep), None)
+            if victim is None:
+                logger.warning(
+                    "Model %s alone (%.1f MB) exceeds memory budget (%.1f MB)",
+                    keep, self.resident_bytes / MB, self.memory_budget_bytes / MB,
+                )
+                return
+            self._loaded.pop(victim)
+            self._status[victim]["state"] = UNLOADED
+            self.evictions += 1
+            logger.info("Evicted model %s to stay under memory budget", victim)
+
+    def _set_status(self, crop: str, state: str, **fields: Any) -> None:
+        with self._lock:
+            self._status.setdefault(crop, {}).update(fields, state=state)
+
+    def _schedule(self, crop: str) -> Optional[Future]:
+        """Submit a background load unless `crop` is loaded, loading, or failed too recently."""
+        with self._lock:
+            if crop not in self._specs or crop in self._loaded:
+                return None
+            pending = self._pending.get(crop)
+            if pending is not None:
+                return pending
+            status = self._status[crop]
+            if status["state"] in (FAILED, MISSING) and time.time() - status.get("attempted_at", 0) < self.retry_after_s:
+                return None
+            status["state"] = LOADING
+            if self._loader is None:
+                self._loader = ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix="model-load")
+            future = self._loader.submit(self.get, crop)
+            self._pending[crop] = future
+        future.add_done_callback(lambda f: self._pending.pop(crop) if self._pending.get(crop) is f else None)
+        return future
+
+    def load_in_background(self, crop: str) -> str:
+        """Make sure `crop` is loaded or loading without blocking; returns its state."""
+        self._schedule(crop)
+        return self.state(crop)
+
+    def preload(self, crops: Iterable[str], wait: bool = True) -> None:
+        """Load `crops` in parallel (on the loader pool); `wait=False` returns immediately."""
+        futures = []
+        for crop in crops:
+            if crop not in self._specs:
+                logger.warning("Cannot preload unknown crop %s", crop)
+                continue
+            future = self._schedule(crop)
+            if future is not None:
+                futures.append(future)
+        if wait:
+            for future in futures:
+                future.result()
+
+    def evict(self, crop: str) -> bool:
+        with self._lock:
+            if self._loaded.pop(crop, None) is None:
+                return False
+            self._status[crop]["state"] = UNLOADED
+            self.evictions += 1
+            return True
+
+    def reload(self, crop: str) -> Optional[LoadedModel]:
+        """Drop the loaded model (if any) and load it again from disk."""
+        spec = self._specs.get(crop)
+        if spec is None:
+            return None
+        with self._load_locks[crop]:
+            with self._lock:
+                self._loaded.pop(crop, None)
+            return self._load(spec)
+
+    # -----------------------
+    # introspection
+    # -----------------------
+    @property
+    def resident_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._loaded.values())
+
+    def state(self, crop: str) -> Optional[str]:
+        status = self._status.get(crop)
+        return status["state"] if status else None
+
+    def attempted(self, crop: str) -> bool:
+        """True once a load of `crop` has finished, whatever its outcome (an evicted model stays attempted)."""
+        status = self._status.get(crop)
+        return bool(status and status.get("attempts"))
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        """crop -> {"state", "error", "load_s", "attempts", "version"} for every registered crop."""
+        with self._lock:
+            out = {}
+            for crop in self._specs:
+                status = self._status.get(crop, {})
+                entry = self._loaded.get(crop)
+                out[crop] = {
+                    "state": status.get("state", UNLOADED),
+                    "error": status.get("error"),
+                    "load_s": status.get("load_s"),
+                    "attempts": status.get("attempts", 0),
+                    "version": entry.version if entry is not None else None,
+                }
+            return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = {
+                crop: {"size_mb": round(e.size_bytes / MB, 2), "version": e.version}
+                for crop, e in self._loaded.items()
+            }
+            resident = self.resident_bytes
+        return {
+            "registered": self.crops,
+            "states": {crop: s["state"] for crop, s in self.states().items()},
+            "loaded_lru_order": loaded,
+            "resident_mb": round(resident / MB, 2),
+            "memory_budget_mb": round(self.memory_budget_bytes / MB, 2) if self.memory_budget_bytes else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,72 @@
+# serve.py
+"""
+Multi-worker launcher: one shared inference server holding the models, plus
+N uvicorn API workers that send it preprocessed batches over a unix socket.
+
+    python -m api.serve --workers 4 --port 8000
+
+Each worker keeps the HTTP, upload, preprocessing and weather work; only the
+models are shared, so memory grows by one small worker per extra core
+instead of one full copy of every model. `--workers 1 --no-shared-models`
+is the plain single-process server (same as the ProcFile command).
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from api.inference_server import default_socket_path
+
+
+def wait_for_socket(path: str, proc: subprocess.Popen, timeout_s: float) -> None:
+    """Block until the inference server accepts connections (or exits / times out)."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"inference server exited with code {proc.returncode}")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"inference server did not come up on {path} within {timeout_s:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--socket", default=default_socket_path())
+    parser.add_argument("--no-shared-models", action="store_true", help="every worker loads its own models")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="seconds to wait for the inference server")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    server = None
+    if not args.no_shared_models:
+        # preloading in the server means no worker request waits for a model load
+        env = dict(os.environ, MODEL_PRELOAD=os.environ.get("MODEL_PRELOAD") or "all")
+        server = subprocess.Popen([sys.executable, "-m", "api.inference_server", "--socket", args.socket], env=env)
+        wait_for_socket(args.socket, server, args.startup_timeout)
+        os.environ["INFERENCE_SERVER_SOCKET"] = args.socket  # inherited by the workers
+    else:
+        os.environ.pop("INFERENCE_SERVER_SOCKET", None)
+
+    try:
+        uvicorn.run("api.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
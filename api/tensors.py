@@ -0,0 +1,93 @@
+# tensors.py
+"""
+Binary body of POST /predict/tensor: images the client already resized to
+the crop model's input size, sent as raw pixels.
+
+    offset  size  field
+    0       4     magic b"AGRT"
+    4       1     version (1)
+    5       1     dtype (1 = uint8)
+    6       16    crop name, ASCII, NUL-padded ("potato", "rice", ...)
+    22      2     count      (uint16, little-endian)
+    24      2     height     (uint16)
+    26      2     width      (uint16)
+    28      1     channels   (3 = RGB)
+    29      3     reserved (zero)
+    32      ...   count * height * width * channels bytes, NHWC row-major
+"""
+import struct
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from api.cache import content_digest
+
+TENSOR_MAGIC = b"AGRT"
+TENSOR_VERSION = 1
+DTYPE_UINT8 = 1
+TENSOR_MEDIA_TYPE = "application/x-agri-tensor"
+
+HEADER = struct.Struct("<4sBB16sHHHB3x")
+
+
+class TensorFormatError(ValueError):
+    """The body is not a valid tensor upload."""
+
+
+@dataclass(frozen=True)
+class TensorBatch:
+    crop: str
+    pixels: np.ndarray  # (count, height, width, channels) uint8, a read-only view of the body
+
+    @property
+    def count(self) -> int:
+        return self.pixels.shape[0]
+
+
+def parse_tensor_body(body: bytes, max_count: int = 0) -> TensorBatch:
+    """Check the header and wrap the pixels without copying them; raises TensorFormatError."""
+    if len(body) < HEADER.size:
+        raise TensorFormatError(f"Body shorter than the {HEADER.size}-byte header")
+    magic, version, dtype, crop, count, height, width, channels = HEADER.unpack_from(body)
+    if magic != TENSOR_MAGIC:
+        raise TensorFormatError("Bad magic (expected b'AGRT')")
+    if version != TENSOR_VERSION:
+        raise TensorFormatError(f"Unsupported version {version} (expected {TENSOR_VERSION})")
+    if dtype != DTYPE_UINT8:
+        raise TensorFormatError(f"Unsupported dtype {dtype} (expected {DTYPE_UINT8} = uint8)")
+    if count == 0:
+        raise TensorFormatError("count is 0")
+    if max_count and count > max_count:
+        raise TensorFormatError(f"At most {max_count} tensors per request")
+    expected = count * height * width * channels
+    if len(body) - HEADER.size != expected:
+        raise TensorFormatError(
+            f"Payload is {len(body) - HEADER.size} bytes, header says {count}x{height}x{width}x{channels} = {expected}"
+        )
+    try:
+        crop_name = crop.rstrip(b"\0").decode("ascii").strip().lower()
+    except UnicodeDecodeError:
+        raise TensorFormatError("Crop name is not ASCII")
+    pixels = np.frombuffer(body, dtype=np.uint8, offset=HEADER.size).reshape(count, height, width, channels)
+    return TensorBatch(crop=crop_name, pixels=pixels)
+
+
+def encode_tensor_body(crop: str, pixels: np.ndarray) -> bytes:
+    """Build a body from (count, H, W, C) or (H, W, C) uint8 pixels (for clients and benchmarks)."""
+    pixels = np.asarray(pixels)
+    if pixels.ndim == 3:
+        pixels = pixels[None]
+    if pixels.ndim != 4 or pixels.dtype != np.uint8:
+        raise ValueError("pixels must be uint8 with shape (count, H, W, C) or (H, W, C)")
+    name = crop.encode("ascii")
+    if len(name) > 16:
+        raise ValueError("crop name longer than 16 bytes")
+    count, height, width, channels = pixels.shape
+    header = HEADER.pack(TENSOR_MAGIC, TENSOR_VERSION, DTYPE_UINT8, name, count, height, width, channels)
+    return header + np.ascontiguousarray(pixels).tobytes()
+
+
+def row_digests(pixels: np.ndarray) -> List[str]:
+    """Prediction-cache digest of every tensor in a batch."""
+    return [content_digest(row) for row in pixels]
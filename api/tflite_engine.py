@@ -0,0 +1,311 @@
+# tflite_engine.py
+"""
+TFLite inference backend for CPU-only hosts.
+
+Converts a crop's Keras model to TFLite (optionally dynamic-range or int8
+quantized), or loads a pre-converted `<model>.<quantization>.tflite` file
+from saved_models/, and runs it through the TFLite interpreter (XNNPACK on
+CPU). Chosen per crop with MODEL_BACKENDS, e.g. "rice=tflite-int8".
+
+Check accuracy before switching a crop over:
+
+    python -m api.tflite_engine --crop rice --quantization int8 --samples path/to/leaf_images --save
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import tensorflow as tf
+
+try:  # LiteRT is the successor of tf.lite.Interpreter; use it when installed
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:  # pragma: no cover - depends on installed packages
+    Interpreter = tf.lite.Interpreter
+
+from api.inference import DEFAULT_BATCH_BUCKETS, KerasEngine
+
+logger = logging.getLogger("agri-api")
+
+QUANTIZATIONS = ("none", "dynamic", "int8")
+
+
+def tflite_path(model_path: str, quantization: str) -> str:
+    """saved_models/rice_v1.keras -> saved_models/rice_v1.int8.tflite"""
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}.{quantization}.tflite"
+
+
+def convert_keras_model(
+    model: Any,
+    quantization: str = "none",
+    representative_data: Optional[Iterable[np.ndarray]] = None,
+) -> bytes:
+    """
+    Convert a Keras model to a TFLite flatbuffer.
+
+    - "none": float32 weights and activations.
+    - "dynamic": int8 weights, float activations (no calibration data needed).
+    - "int8": int8 weights and activations, calibrated on `representative_data`
+      (an iterable of (1, H, W, 3) float32 inputs). Inputs/outputs stay float32
+      so the engine is a drop-in replacement.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r} (use {'/'.join(QUANTIZATIONS)})")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "int8":
+        if representative_data is None:
+            raise ValueError("int8 quantization needs representative_data for calibration")
+        samples = list(representative_data)
+
+        def _gen():
+            for x in samples:
+                yield [np.asarray(x, dtype=np.float32)]
+
+        converter.representative_dataset = _gen
+    return converter.convert()
+
+
+class TFLiteEngine:
+    """
+    Same interface as InferenceEngine (`predict`, `warmup`) on top of the
+    TFLite interpreter.
+
+    An interpreter is not thread-safe and resizing its input re-allocates
+    every tensor, so one interpreter is kept per batch-size bucket (created on
+    first use) and guarded by a lock. Batches are padded up to the nearest
+    bucket and split above the largest, as in InferenceEngine.
+    """
+
+    def __init__(
+        self,
+        model_content: bytes,
+        input_size: int,
+        num_threads: int = 2,
+        batch_buckets: Sequence[int] = DEFAULT_BATCH_BUCKETS,
+        name: str = "",
+        quantization: str = "none",
+    ):
+        self.model_content = model_content
+        self.input_size = int(input_size)
+        self.num_threads = max(1, int(num_threads))
+        self.name = name
+        self.quantization = quantization
+        self.batch_buckets = sorted({int(b) for b in batch_buckets if int(b) > 0}) or [1]
+        self._interpreters: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.model_content)
+
+    @property
+    def max_bucket(self) -> int:
+        return self.batch_buckets[-1]
+
+    def bucket_for(self, n: int) -> int:
+        for b in self.batch_buckets:
+            if b >= n:
+                return b
+        return self.max_bucket
+
+    def _interpreter(self, bucket: int):
+        it = self._interpreters.get(bucket)
+        if it is None:
+            # the default op resolver applies the XNNPACK delegate on CPU
+            it = Interpreter(model_content=self.model_content, num_threads=self.num_threads)
+            inp = it.get_input_details()[0]
+            it.resize_tensor_input(inp["index"], [bucket, self.input_size, self.input_size, 3])
+            it.allocate_tensors()
+            self._interpreters[bucket] = it
+        return it
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        outputs = []
+        for start in range(0, batch.shape[0], self.max_bucket):
+            outputs.append(self._run_bucket(batch[start:start + self.max_bucket]))
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=0)
+
+    def _run_bucket(self, chunk: np.ndarray) -> np.ndarray:
+        k = chunk.shape[0]
+        b = self.bucket_for(k)
+        if b != k:
+            padded = np.zeros((b,) + chunk.shape[1:], dtype=np.float32)
+            padded[:k] = chunk
+            chunk = padded
+        with self._lock:
+            it = self._interpreter(b)
+            it.set_tensor(it.get_input_details()[0]["index"], chunk)
+            it.invoke()
+            out = it.get_tensor(it.get_output_details()[0]["index"])
+        return out[:k]
+
+    def warmup(self, rounds: int = 1) -> Dict[str, float]:
+        for b in self.batch_buckets:
+            x = np.zeros((b, self.input_size, self.input_size, 3), dtype=np.float32)
+            for _ in range(max(1, rounds)):
+                self._run_bucket(x)
+        logger.info("Warmed up %s TFLite engine (%s, buckets %s)", self.name, self.quantization, self.batch_buckets)
+        return {}
+
+
+def load_tflite_engine(
+    model_path: str,
+    input_size: int,
+    quantization: str = "none",
+    load_keras: Optional[Callable[[str], Any]] = None,
+    calibration_fn: Optional[Callable[[], List[np.ndarray]]] = None,
+    save_converted: bool = False,
+    **engine_kwargs,
+) -> Optional[TFLiteEngine]:
+    """
+    Load `<model>.<quantization>.tflite` if it exists, otherwise convert the
+    Keras model at `model_path` (and write the .tflite next to it if
+    `save_converted`). `calibration_fn` is only called when an int8 model has
+    to be converted; with no calibration images it falls back to dynamic-range
+    quantization. Returns None if neither file is available.
+    """
+    path = tflite_path(model_path, quantization)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            content = f.read()
+        logger.info("Loaded pre-converted TFLite model: %s", path)
+    else:
+        if not os.path.exists(model_path):
+            logger.warning("Model file not found: %s", model_path)
+            return None
+        model = (load_keras or tf.keras.models.load_model)(model_path)
+        if model is None:
+            return None
+        representative = None
+        if quantization == "int8":
+            representative = calibration_fn() if calibration_fn else None
+            if not representative:
+                logger.warning("No calibration images for %s; using dynamic-range quantization instead of int8", model_path)
+                quantization = "dynamic"
+                path = tflite_path(model_path, quantization)
+        content = convert_keras_model(model, quantization, representative)
+        logger.info("Converted %s to TFLite (%s, %.1f MB)", model_path, quantization, len(content) / 1e6)
+        if save_converted:
+            with open(path, "wb") as f:
+                f.write(content)
+    return TFLiteEngine(content, input_size, quantization=quantization, **engine_kwargs)
+
+
+def load_sample_inputs(sample_dir: str, preprocess: Callable[[bytes], np.ndarray], limit: int = 200) -> List[np.ndarray]:
+    """Preprocess up to `limit` images found under `sample_dir` (non-images are skipped)."""
+    rows = []
+    for root, _, files in os.walk(sample_dir):
+        for name in sorted(files):
+            if len(rows) >= limit:
+                return rows
+            try:
+                with open(os.path.join(root, name), "rb") as f:
+                    rows.append(preprocess(f.read()))
+            except Exception:
+                continue
+    return rows
+
+
+# -----------------------
+# Accuracy parity
+# -----------------------
+def split_calibration(samples: Sequence[np.ndarray], quantization: str, holdout: float = 0.5):
+    """
+    (calibration, holdout) rows. Only int8 calibrates, and parity measured on
+    the calibration images would flatter it, so a seeded shuffle keeps
+    `holdout` of them out; other quantizations check parity on all of them.
+    """
+    if quantization != "int8":
+        return [], list(samples)
+    order = np.random.default_rng(0).permutation(len(samples))
+    n_holdout = min(len(samples) - 1, max(1, round(len(samples) * holdout)))
+    return [samples[i] for i in order[n_holdout:]], [samples[i] for i in order[:n_holdout]]
+
+
+def parity_report(reference: Any, candidate: Any, samples: np.ndarray, batch_size: int = 16) -> Dict[str, Any]:
+    """Top-1 agreement and probability drift of `candidate` vs `reference` on `samples` (N, H, W, 3)."""
+    ref, cand = [], []
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        ref.append(np.asarray(reference.predict(chunk)))
+        cand.append(np.asarray(candidate.predict(chunk)))
+    ref = np.concatenate(ref)
+    cand = np.concatenate(cand)
+    agree = np.argmax(ref, axis=1) == np.argmax(cand, axis=1)
+    diff = np.abs(ref - cand)
+    return {
+        "samples": int(len(samples)),
+        "top1_agreement": round(float(agree.mean()), 4) if len(agree) else None,
+        "disagreements": [int(i) for i in np.flatnonzero(~agree)],
+        "max_abs_prob_diff": round(float(diff.max()), 5) if diff.size else None,
+        "mean_abs_prob_diff": round(float(diff.mean()), 6) if diff.size else None,
+    }
+
+
+def main():
+    from api import main as app_main
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crop", required=True)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="dynamic")
+    parser.add_argument("--samples", help="directory of leaf images used for calibration and parity")
+    parser.add_argument("--calibration", help="separate directory of int8 calibration images (default: split --samples)")
+    parser.add_argument("--holdout", type=float, default=0.5,
+                        help="fraction of --samples kept out of int8 calibration for the parity check")
+    parser.add_argument("--limit", type=int, default=200, help="max sample images")
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--save", action="store_true", help="write the converted .tflite next to the .keras model")
+    args = parser.parse_args()
+
+    spec = app_main.REGISTRY.spec(args.crop)
+    if spec is None:
+        parser.error(f"unknown crop {args.crop!r}")
+    keras_model = app_main.load_model_safe(spec.path)
+    if keras_model is None:
+        parser.error(f"model file not found: {spec.path}")
+
+    def preprocess(b: bytes) -> np.ndarray:
+        return app_main.preprocess_image(b, spec.input_size, spec.preprocessing)
+
+    if args.samples:
+        samples = load_sample_inputs(args.samples, preprocess, args.limit)
+    else:
+        logger.warning("No --samples given; using random inputs (agreement on noise is only a smoke test)")
+        rng = np.random.default_rng(0)
+        samples = [rng.random((1, spec.input_size, spec.input_size, 3), dtype=np.float32) for _ in range(32)]
+    if not samples:
+        parser.error(f"no readable images under {args.samples}")
+    if args.quantization == "int8" and args.calibration:
+        calibration, holdout = load_sample_inputs(args.calibration, preprocess, args.limit), samples
+        if not calibration:
+            parser.error(f"no readable images under {args.calibration}")
+    else:
+        calibration, holdout = split_calibration(samples, args.quantization, args.holdout)
+    if not holdout:
+        parser.error("int8 needs at least 2 --samples images (calibration and holdout), or a --calibration dir")
+    content = convert_keras_model(keras_model, args.quantization, calibration)
+    if args.save:
+        with open(tflite_path(spec.path, args.quantization), "wb") as f:
+            f.write(content)
+    candidate = TFLiteEngine(content, spec.input_size, num_threads=args.threads, quantization=args.quantization)
+
+    report = parity_report(KerasEngine(keras_model, spec.input_size), candidate, np.concatenate(holdout))
+    report.update({
+        "crop": args.crop,
+        "quantization": args.quantization,
+        "calibration_samples": len(calibration),
+        "holdout_samples": len(holdout),
+        "tflite_mb": round(len(content) / 1e6, 3),
+    })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
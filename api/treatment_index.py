@@ -0,0 +1,121 @@
+# treatment_index.py
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger("agri-api")
+
+EMPTY_TREATMENT: Dict[str, Any] = {"organic": [], "chemical": []}
+
+
+def normalize_key(label: str) -> str:
+    """'Early blight' / 'Tomato_Early_blight' -> the treatments.py key style ('early_blight')."""
+    return label.strip().lower().replace(" ", "_")
+
+
+@dataclass(frozen=True)
+class TreatmentEntry:
+    crop: str
+    key: str  # normalized treatments.py key
+    label: str  # canonical class label from the crop's model (or the key if no class matches)
+    treatment: Dict[str, Any]
+    body: bytes  # pre-serialized /treatment response
+    etag: str  # strong ETag of `body`
+
+
+class TreatmentIndex:
+    """
+    Treatments from api/treatments.py, indexed once at startup.
+
+    - (crop, class label) -> treatment for the predict path, no string munging per request
+    - normalized key -> entry for /treatment/{predicted_class}, with the JSON
+      response pre-serialized and a strong ETag (hash of those bytes)
+
+    Built against each crop's class list: classes without a treatment and
+    treatments matching no class are reported in `problems` (and logged), or
+    raise ValueError with `strict=True`.
+    """
+
+    def __init__(self, treatments: Mapping[str, Any], classes_by_crop: Mapping[str, Iterable[str]], strict: bool = False):
+        self.by_label: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.by_key: Dict[str, TreatmentEntry] = {}
+        self.by_crop_key: Dict[Tuple[str, str], TreatmentEntry] = {}
+        self.problems: List[str] = []
+
+        if not isinstance(treatments, Mapping):
+            raise ValueError("treatments must be a dict of crop -> {disease key: treatment}")
+
+        labels = {
+            crop: {normalize_key(label): label for label in classes}
+            for crop, classes in classes_by_crop.items()
+        }
+        for crop, crop_map in treatments.items():
+            if not isinstance(crop_map, Mapping):
+                self.problems.append(f"{crop}: not a dict, skipped")
+                continue
+            crop_labels = labels.get(crop, {})
+            for key, treatment in crop_map.items():
+                if not isinstance(treatment, Mapping):
+                    self.problems.append(f"{crop}/{key}: not a dict, skipped")
+                    continue
+                key = normalize_key(key)
+                label = crop_labels.get(key)
+                if label is None:
+                    self.problems.append(f"{crop}/{key}: no matching class label")
+                entry = self._entry(crop, key, label or key, dict(treatment))
+                self.by_crop_key[(crop, key)] = entry
+                # first crop wins for crop-less lookups (the order treatments.py lists them)
+                self.by_key.setdefault(key, entry)
+                if label is not None:
+                    self.by_label[(crop, label)] = entry.treatment
+
+        for crop, crop_labels in labels.items():
+            for key, label in crop_labels.items():
+                if (crop, key) not in self.by_crop_key:
+                    self.problems.append(f"{crop}/{label}: no treatment")
+
+        if self.problems:
+            if strict:
+                raise ValueError("treatments.py does not match the model classes: " + "; ".join(self.problems))
+            logger.warning("Treatment index: %d issue(s): %s", len(self.problems), "; ".join(self.problems))
+
+    @staticmethod
+    def _entry(crop: str, key: str, label: str, treatment: Dict[str, Any]) -> TreatmentEntry:
+        # canonical label, not the caller's spelling: every spelling gets the same bytes and ETag
+        body = json.dumps(
+            {"disease": label, "crop_type": crop, "treatment_info": treatment},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        return TreatmentEntry(crop=crop, key=key, label=label, treatment=treatment, body=body, etag=etag)
+
+    def for_class(self, crop: str, label: str) -> Dict[str, Any]:
+        """Treatment for a model's class label (the empty treatment if there is none)."""
+        treatment = self.by_label.get((crop, label))
+        if treatment is None:
+            entry = self.by_crop_key.get((crop, normalize_key(label)))
+            treatment = entry.treatment if entry is not None else EMPTY_TREATMENT
+        return treatment
+
+    def find(self, predicted_class: str, crop: Optional[str] = None) -> Optional[TreatmentEntry]:
+        """Entry for a class label or key in any style (case-insensitive), optionally for one crop."""
+        key = normalize_key(predicted_class)
+        if crop:
+            return self.by_crop_key.get((crop, key))
+        return self.by_key.get(key)
+
+    def __len__(self) -> int:
+        return len(self.by_crop_key)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for it)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
@@ -0,0 +1,104 @@
+# uploads.py
+import json
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def _too_large(what: str, max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{what} larger than {max_bytes} bytes")
+
+
+async def read_upload(file: UploadFile, max_bytes: int, chunk_size: int = READ_CHUNK_BYTES) -> bytes:
+    """
+    Read an uploaded file into one `bytes` object, refusing (413) anything over
+    `max_bytes` without reading past the limit.
+
+    When the multipart parser already knows the part size, oversized files are
+    rejected before any read and the rest is a single bounded read; otherwise
+    chunks are read until the cap. The result is `bytes` on purpose:
+    `BytesIO(bytes)` shares the buffer instead of copying it, so the decoder
+    reads the upload in place. `max_bytes <= 0` means no limit.
+    """
+    if max_bytes <= 0:
+        return await file.read()
+    if file.size is not None:
+        if file.size > max_bytes:
+            raise _too_large("File", max_bytes)
+        data = await file.read(max_bytes + 1)
+    else:
+        chunks: List[bytes] = []
+        total = 0
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise _too_large("File", max_bytes)
+            chunks.append(chunk)
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    if len(data) > max_bytes:
+        raise _too_large("File", max_bytes)
+    return data
+
+
+class BodySizeLimitMiddleware:
+    """
+    Pure ASGI middleware capping request bodies at `max_bytes`.
+
+    A larger Content-Length is answered with 413 before the body is read; a
+    body without one (chunked) is counted as it streams in and cut off with
+    413 once it passes the cap, so the multipart parser never spools more than
+    `max_bytes` to memory or disk.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = int(max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        declared = _content_length(scope)
+        if declared is not None and declared > self.max_bytes:
+            await _send_413(send, f"Request body larger than {self.max_bytes} bytes")
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise _too_large("Request body", self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def _send_413(send, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,245 @@
+# weather.py
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+import httpx
+
+from api.cache import TTLCache
+
+logger = logging.getLogger("agri-api")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def grid_key(lat: float, lon: float, grid_deg: float) -> Tuple[float, float]:
+    """Snap coordinates to the nearest point of a `grid_deg` grid (0.1 deg ~ 11 km)."""
+    if grid_deg <= 0:
+        return (lat, lon)
+    return (round(round(lat / grid_deg) * grid_deg, 6), round(round(lon / grid_deg) * grid_deg, 6))
+
+
+class UpstreamError(Exception):
+    """OpenWeather could not be reached or kept failing after retries."""
+
+
+class WeatherClient:
+    """
+    Async OpenWeather client shared by all requests.
+
+    - one pooled `httpx.AsyncClient` (keep-alive, so repeat calls skip TCP/TLS setup)
+    - per-call timeouts, retries with exponential backoff on network errors,
+      429 and 5xx responses
+    - request coalescing: concurrent identical calls (same URL + params) share
+      a single upstream request and all waiters get its result
+    - bounded TTL caches: geocode results by normalised name, forecasts by
+      lat/lon snapped to a `forecast_grid_deg` grid (neighbouring farms share
+      one entry). A forecast older than `forecast_ttl_s` but younger than
+      `forecast_ttl_s + forecast_stale_s` is served immediately while a
+      background refresh runs (stale-while-revalidate).
+    - `refresh_forecast(cell)` refetches a cell ahead of need (see
+      api/prefetch.py); request-path lookups answered from such an entry are
+      counted as `prefetch_hits`
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = "https://api.openweathermap.org",
+        geocode_timeout_s: float = 8.0,
+        forecast_timeout_s: float = 10.0,
+        retries: int = 2,
+        backoff_s: float = 0.25,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        geocode_cache_size: int = 10000,
+        geocode_ttl_s: float = 7 * 24 * 3600.0,
+        forecast_cache_size: int = 5000,
+        forecast_ttl_s: float = 1800.0,
+        forecast_stale_s: float = 3 * 3600.0,
+        forecast_grid_deg: float = 0.1,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.geocode_url = f"{self.base_url}/geo/1.0/direct"
+        self.forecast_url = f"{self.base_url}/data/2.5/forecast"  # 5 day / 3 hour
+        self.geocode_timeout_s = geocode_timeout_s
+        self.forecast_timeout_s = forecast_timeout_s
+        self.retries = max(0, int(retries))
+        self.backoff_s = backoff_s
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        self.geocode_cache = TTLCache(geocode_cache_size, geocode_ttl_s)
+        self.forecast_ttl_s = forecast_ttl_s
+        self.forecast_grid_deg = forecast_grid_deg
+        # entries live for fresh + stale window; age decides which one applies
+        self.forecast_cache = TTLCache(forecast_cache_size, forecast_ttl_s + max(0.0, forecast_stale_s))
+        self._refreshing: Set[Tuple[float, float]] = set()
+        self._prefetched: Set[Tuple[float, float]] = set()  # cells whose cached entry came from refresh_forecast
+
+        # stats
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failures = 0
+        self.stale_served = 0
+        self.background_refreshes = 0
+        self.fresh_hits = 0
+        self.prefetch_hits = 0
+        self.request_fetches = 0  # forecasts fetched while a request waited
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -----------------------
+    # request plumbing
+    # -----------------------
+    async def get_json(self, url: str, params: Dict[str, Any], timeout_s: float) -> Any:
+        """GET `url` and decode JSON; identical concurrent calls share one upstream request."""
+        key = (url, tuple(sorted(params.items())))
+        fut = self._in_flight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_task(self._get_with_retries(url, params, timeout_s))
+        self._in_flight[key] = fut
+        fut.add_done_callback(lambda f: self._in_flight.pop(key) if self._in_flight.get(key) is f else None)
+        # shield: one caller being cancelled must not cancel the call for everyone else
+        return await asyncio.shield(fut)
+
+    async def _get_with_retries(self, url: str, params: Dict[str, Any], timeout_s: float) -> Any:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.backoff_s * (2 ** (attempt - 1)))
+            self.upstream_calls += 1
+            try:
+                r = await self._http().get(url, params=params, timeout=timeout_s)
+            except httpx.HTTPError as e:  # timeouts, connection errors
+                last_error = e
+                continue
+            if r.status_code in RETRY_STATUSES:
+                last_error = UpstreamError(f"HTTP {r.status_code} from {url}")
+                continue
+            try:
+                r.raise_for_status()
+                return r.json()
+            except Exception as e:  # 4xx or bad JSON: retrying won't help
+                self.failures += 1
+                raise UpstreamError(str(e)) from e
+        self.failures += 1
+        raise UpstreamError(f"{url} failed after {self.retries + 1} attempts: {last_error}")
+
+    # -----------------------
+    # OpenWeather endpoints
+    # -----------------------
+    async def geocode(self, location: str) -> Optional[Dict[str, float]]:
+        """Return {'lat': float, 'lon': float} or None. Uses OpenWeather geocoding."""
+        if not self.enabled:
+            return None
+        # normalised so "Pune" and " pune" share a cache entry and an upstream call
+        q = " ".join(location.lower().split())
+        cached = self.geocode_cache.get(q)
+        if cached is not None:
+            return cached
+        params = {"q": q, "limit": 1, "appid": self.api_key}
+        try:
+            data = await self.get_json(self.geocode_url, params, self.geocode_timeout_s)
+            if not data:
+                return None
+            coords = {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
+        except Exception as e:
+            logger.warning("Geocode failed for %s: %s", location, e)
+            return None
+        self.geocode_cache.set(q, coords)
+        return coords
+
+    def forecast_cell(self, lat: float, lon: float) -> Tuple[float, float]:
+        """Forecast cache key (grid cell) for a location."""
+        return grid_key(lat, lon, self.forecast_grid_deg)
+
+    def forecast_age(self, cell: Tuple[float, float]) -> Optional[float]:
+        """Age of the cached forecast for `cell` (fresh or stale), None if there is none."""
+        return self.forecast_cache.age(cell)
+
+    async def forecast(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        cell = self.forecast_cell(lat, lon)
+        cached = self.forecast_cache.get_with_age(cell)
+        if cached is not None:
+            data, age = cached
+            if age > self.forecast_ttl_s:
+                self.stale_served += 1
+                self._refresh_in_background(cell)
+            else:
+                self.fresh_hits += 1
+                if cell in self._prefetched:
+                    self.prefetch_hits += 1
+            return data
+        self.request_fetches += 1
+        return await self._fetch_forecast(cell)
+
+    async def refresh_forecast(self, cell: Tuple[float, float]) -> bool:
+        """Fetch `cell` again now, whatever its cache state; False if the fetch failed."""
+        return await self._fetch_forecast(cell, prefetch=True) is not None
+
+    async def _fetch_forecast(self, cell: Tuple[float, float], prefetch: bool = False) -> Optional[Dict[str, Any]]:
+        lat, lon = cell
+        params = {"lat": lat, "lon": lon, "units": "metric", "appid": self.api_key}
+        try:
+            data = await self.get_json(self.forecast_url, params, self.forecast_timeout_s)
+        except Exception as e:
+            logger.warning("Forecast fetch failed for %s,%s: %s", lat, lon, e)
+            return None
+        self.forecast_cache.set(cell, data)
+        if prefetch:
+            self._prefetched.add(cell)
+            if len(self._prefetched) > 2 * max(1, self.forecast_cache.max_entries):
+                # forget cells the cache has since evicted
+                self._prefetched = {c for c in self._prefetched if self.forecast_cache.age(c) is not None}
+        else:
+            self._prefetched.discard(cell)
+        return data
+
+    def _refresh_in_background(self, cell: Tuple[float, float]) -> None:
+        if cell in self._refreshing:
+            return
+        self._refreshing.add(cell)
+        self.background_refreshes += 1
+        task = asyncio.get_running_loop().create_task(self._fetch_forecast(cell))
+        task.add_done_callback(lambda _: self._refreshing.discard(cell))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failures": self.failures,
+            "in_flight": len(self._in_flight),
+            "stale_served": self.stale_served,
+            "background_refreshes": self.background_refreshes,
+            "fresh_hits": self.fresh_hits,
+            "prefetch_hits": self.prefetch_hits,
+            "request_fetches": self.request_fetches,
+            "geocode_cache": self.geocode_cache.stats(),
+            "forecast_cache": self.forecast_cache.stats(),
+            "forecast_grid_deg": self.forecast_grid_deg,
+        }
@@ -0,0 +1,184 @@
+# weather_advice.py
+"""
+Spray advice for many forecasts and horizons in one vectorized pass.
+
+OpenWeather's 5 day / 3 hour forecast is turned into (forecasts x steps)
+arrays once; cumulative sums / maxima along the time axis then give the rain
+total, peak precipitation probability and mean humidity for every horizon
+at the cost of a single index per (forecast, horizon).
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+STEPS_PER_DAY = 8  # 3-hour buckets
+MAX_DAYS = 5  # what the 5 day / 3 hour forecast covers
+
+# generic thresholds (before any disease-specific weather_rules)
+HEAVY_RAIN_MM = 10.0
+HIGH_POP = 0.6
+HIGH_HUMIDITY_PCT = 85.0
+
+# recommendation codes, in the order the rules are checked
+NO_DATA, HEAVY_RAIN, HIGH_RAIN_CHANCE, HIGH_HUMIDITY, SUITABLE, RULE_RAIN, RULE_HUMIDITY = range(7)
+
+
+def rain_rule_message(threshold: float) -> str:
+    return f"Based on disease-specific rule (rain >= {threshold} mm) heavy rain expected; delay chemical spraying."
+
+
+def humidity_rule_message(threshold: float) -> str:
+    return f"Based on disease-specific rule (humidity >= {threshold}%) high humidity detected; consider preventive steps."
+
+
+def forecast_arrays(forecasts: Sequence[Optional[Dict[str, Any]]], max_steps: int = MAX_DAYS * STEPS_PER_DAY):
+    """
+    (rain, pop, humidity, steps, has_data) for a list of forecast JSONs.
+
+    rain/pop/humidity are (n, max_steps) float arrays; rain is 0 where a
+    bucket has none, pop and humidity are NaN where missing. `steps` is the
+    number of entries each forecast has, `has_data` False for forecasts that
+    are None or have no "list".
+    """
+    n = len(forecasts)
+    steps = np.zeros(n, dtype=np.int64)
+    has_data = np.zeros(n, dtype=bool)
+    entries = []
+    for i, fc in enumerate(forecasts):
+        if not fc or "list" not in fc:
+            continue
+        has_data[i] = True
+        window = fc["list"][:max_steps]
+        steps[i] = len(window)
+        entries.extend(window)
+
+    # all entries in row-major order, scattered into the padded arrays at once;
+    # float arrays turn None (missing) into NaN
+    filled = np.arange(max_steps)[None, :] < steps[:, None]
+    rain = np.zeros((n, max_steps), dtype=np.float64)
+    pop = np.full((n, max_steps), np.nan)
+    hum = np.full((n, max_steps), np.nan)
+    rain[filled] = [ent["rain"].get("3h", 0.0) if "rain" in ent else 0.0 for ent in entries]
+    pop[filled] = np.array([ent.get("pop") for ent in entries], dtype=np.float64)
+    hum[filled] = np.array([ent.get("main", {}).get("humidity") for ent in entries], dtype=np.float64)
+    return rain, pop, hum, steps, has_data
+
+
+def window_summaries(rain: np.ndarray, pop: np.ndarray, hum: np.ndarray, steps: np.ndarray, horizons_days: Sequence[int]):
+    """
+    Rain total, max pop and mean humidity over the first `days` of every
+    forecast, for every horizon: three (n, len(horizons_days)) arrays, NaN
+    where a window has no values (rain is 0 for an empty window).
+    """
+    n, max_steps = rain.shape
+    # last index of each (forecast, horizon) window; -1 for an empty window
+    want = np.minimum(np.asarray(horizons_days, dtype=np.int64) * STEPS_PER_DAY, max_steps)
+    last = np.minimum(want[None, :], steps[:, None]) - 1
+    empty = last < 0
+    last = np.maximum(last, 0)
+    rows = np.arange(n)[:, None]
+
+    rain_cum = np.cumsum(rain, axis=1)
+    pop_max = np.fmax.accumulate(pop, axis=1)  # fmax ignores NaN (missing pop)
+    hum_seen = ~np.isnan(hum)
+    hum_sum = np.cumsum(np.where(hum_seen, hum, 0.0), axis=1)
+    hum_count = np.cumsum(hum_seen, axis=1)
+
+    rain_mm = np.where(empty, 0.0, rain_cum[rows, last])
+    max_pop = np.where(empty, np.nan, pop_max[rows, last])
+    count = np.where(empty, 0, hum_count[rows, last])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_humidity = np.where(count > 0, hum_sum[rows, last] / np.maximum(count, 1), np.nan)
+    return rain_mm, max_pop, avg_humidity
+
+
+def recommendation_codes(rain_mm, max_pop, avg_humidity, has_data, rain_rule=None, humidity_rule=None) -> np.ndarray:
+    """
+    Which recommendation applies to each (forecast, horizon) cell.
+
+    `rain_rule` / `humidity_rule` are per-forecast disease thresholds (NaN for
+    none). As in a single-location summary, they are compared with the rounded
+    figures, and the humidity rule wins over the rain rule, which wins over
+    the generic advice.
+    """
+    shape = rain_mm.shape
+    rain_rule = np.full(shape[0], np.nan) if rain_rule is None else np.asarray(rain_rule, dtype=np.float64)
+    humidity_rule = np.full(shape[0], np.nan) if humidity_rule is None else np.asarray(humidity_rule, dtype=np.float64)
+    data = np.broadcast_to(has_data[:, None], shape)
+    with np.errstate(invalid="ignore"):
+        rule_hum = data & (np.round(avg_humidity, 1) >= humidity_rule[:, None])
+        rule_rain = data & (np.round(rain_mm, 2) >= rain_rule[:, None])
+        return np.select(
+            [~data, rule_hum, rule_rain, rain_mm >= HEAVY_RAIN_MM, max_pop >= HIGH_POP, avg_humidity >= HIGH_HUMIDITY_PCT],
+            [NO_DATA, RULE_HUMIDITY, RULE_RAIN, HEAVY_RAIN, HIGH_RAIN_CHANCE, HIGH_HUMIDITY],
+            default=SUITABLE,
+        )
+
+
+def _message(code: int, days: int, rain: float, pop: float, hum: float, rain_rule: float, humidity_rule: float) -> str:
+    if code == NO_DATA:
+        return "No weather data."
+    if code == RULE_HUMIDITY:
+        return humidity_rule_message(_threshold(humidity_rule))
+    if code == RULE_RAIN:
+        return rain_rule_message(_threshold(rain_rule))
+    if code == HEAVY_RAIN:
+        return f"Heavy rain (~{rain:.1f} mm over next {days} days). Chemical sprays may wash off; recommend waiting 3–4 days."
+    if code == HIGH_RAIN_CHANCE:
+        return f"High chance of rain (peak {pop:.0%}). Prefer organic or delay chemical spray."
+    if code == HIGH_HUMIDITY:
+        return f"Very high humidity (~{hum:.0f}%) — conditions favor disease. Consider preventive treatment."
+    return "Weather suitable for application now."
+
+
+def _threshold(value: float):
+    # weather_rules thresholds are usually ints; print them the way they were written
+    return int(value) if float(value).is_integer() else value
+
+
+def _rule_threshold(rules: Optional[Dict[str, Any]], name: str) -> float:
+    value = rules.get(name) if isinstance(rules, dict) else None
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def advise(
+    forecasts: Sequence[Optional[Dict[str, Any]]],
+    horizons_days: Sequence[int],
+    rules: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Advice for every forecast and horizon: result[i][j] is
+    {"days", "rain_mm", "max_pop", "avg_humidity", "recommendation"} for
+    forecasts[i] over the first horizons_days[j] days, with rules[i] (a
+    treatment's weather_rules, or None) applied.
+    """
+    rain, pop, hum, steps, has_data = forecast_arrays(forecasts)
+    rain_mm, max_pop, avg_humidity = window_summaries(rain, pop, hum, steps, horizons_days)
+    rules = rules if rules is not None else [None] * len(forecasts)
+    rain_rule = np.array([_rule_threshold(r, "heavy_rain_mm") for r in rules], dtype=np.float64)
+    humidity_rule = np.array([_rule_threshold(r, "humidity_high_pct") for r in rules], dtype=np.float64)
+    codes = recommendation_codes(rain_mm, max_pop, avg_humidity, has_data, rain_rule, humidity_rule)
+
+    # back to Python scalars once, then only formatting is left per cell
+    rain_l, pop_l, hum_l, codes_l = rain_mm.tolist(), max_pop.tolist(), avg_humidity.tolist(), codes.tolist()
+    rain_rule_l, humidity_rule_l, has_data_l = rain_rule.tolist(), humidity_rule.tolist(), has_data.tolist()
+    out = []
+    for i in range(len(forecasts)):
+        row = []
+        for j, days in enumerate(horizons_days):
+            if not has_data_l[i]:
+                row.append({"days": days, "rain_mm": None, "max_pop": None, "avg_humidity": None, "recommendation": "No weather data."})
+                continue
+            r, p, h = rain_l[i][j], pop_l[i][j], hum_l[i][j]
+            row.append({
+                "days": days,
+                "rain_mm": round(r, 2),
+                "max_pop": round(p, 2) if p == p else None,  # NaN -> None
+                "avg_humidity": round(h, 1) if h == h else None,
+                "recommendation": _message(codes_l[i][j], days, r, p, h, rain_rule_l[i], humidity_rule_l[i]),
+            })
+        out.append(row)
+    return out
@@ -0,0 +1,65 @@
+# bench_inference.py
+"""
+Compare `model.predict` with the traced InferenceEngine per crop and batch size.
+
+    python -m benchmarks.bench_inference --crops potato,rice --batch-sizes 1,4,16
+
+Uses the real models from saved_models/ when present, stand-ins otherwise.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from api.inference import InferenceEngine
+from benchmarks.common import CROPS, emit, load_or_stand_in, time_calls
+
+
+def bench_crop(crop: str, batch_sizes, repeats: int):
+    model, size, is_real = load_or_stand_in(crop)
+    buckets = sorted(set(batch_sizes))
+
+    # cost of the first request with and without warm-up
+    t0 = time.perf_counter()
+    engine = InferenceEngine(model, size, batch_buckets=buckets, name=crop)
+    trace_ms = (time.perf_counter() - t0) * 1000.0
+    x1 = np.random.rand(1, size, size, 3).astype(np.float32)
+    t0 = time.perf_counter()
+    engine.predict(x1)
+    cold_first_ms = (time.perf_counter() - t0) * 1000.0
+    engine.warmup(rounds=2)
+
+    result = {
+        "real_model": is_real,
+        "input_size": size,
+        "trace_ms": round(trace_ms, 2),
+        "cold_first_call_ms": round(cold_first_ms, 2),
+        "batch": {},
+    }
+    for bs in batch_sizes:
+        x = np.random.rand(bs, size, size, 3).astype(np.float32)
+        before = time_calls(lambda: model.predict(x, verbose=0), repeats, warmup=2)
+        after = time_calls(lambda: engine.predict(x), repeats, warmup=2)
+        result["batch"][str(bs)] = {
+            "keras_predict": before,
+            "traced_engine": after,
+            "speedup_p50": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crops", default=",".join(CROPS))
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+    results = {crop: bench_crop(crop, batch_sizes, args.repeats) for crop in args.crops.split(",") if crop.strip()}
+    emit({"benchmark": "inference", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
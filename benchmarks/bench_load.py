@@ -0,0 +1,223 @@
+# bench_load.py
+"""
+End-to-end load test: drives /predict (with and without weather) and
+/treatment/{predicted_class} at a fixed concurrency and reports throughput,
+p50/p95/p99 latency and errors per scenario.
+
+    python -m benchmarks.bench_load --concurrency 16 --seconds 20
+    python -m benchmarks.bench_load --scenarios predict --weather-latency-ms 300
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000   # an already running server
+
+Unless --url is given, it starts the OpenWeather stub and `uvicorn api.main:app`
+on free ports, with the models in MODEL_DIR (stand-ins in a temp directory when
+those are missing, or with --stand-in) and the prediction cache off so every
+/predict request runs decode + inference (--cache keeps it on).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_preprocess import synthetic_leaf
+from benchmarks.common import CROPS, MODEL_DIR, REPO_DIR, emit, free_port, latency_stats, write_stand_in_models
+
+SCENARIOS = ("predict", "predict_weather", "treatment")
+LOCATIONS = ("Pune", "Nashik", "Nagpur", "19.07,72.87", "18.52,73.85", "21.15,79.09", "Ludhiana", "Guntur")
+# class labels that have a treatment, per crop (requested from /treatment)
+CLASS_LABELS = {
+    "potato": ("Early blight", "Late blight", "Healthy"),
+    "tomato": ("Tomato_Bacterial_spot", "Tomato_Early_blight", "Tomato_Late_blight", "Tomato_Leaf_Mold", "Tomato_healthy"),
+    "pepper": ("Pepper__bell_Bacterial_spot", "Pepper__bell_healthy"),
+    "rice": ("bacterial_leaf_blight", "normal"),
+}
+
+
+# -----------------------
+# servers
+# -----------------------
+def start_stub(port: int, latency_ms: float, jitter_ms: float) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "benchmarks.openweather_stub", "--port", str(port),
+           "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms)]
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_api(port: int, model_dir: str, stub_url: str, cache: bool) -> subprocess.Popen:
+    env = dict(os.environ, MODEL_DIR=model_dir, MODEL_PRELOAD="all", PYTHONPATH=REPO_DIR,
+               OPENWEATHER_API_KEY="stub", OPENWEATHER_BASE_URL=stub_url)
+    if not cache:
+        env["PREDICTION_CACHE_SIZE"] = "0"
+    cmd = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def wait_ready(client: httpx.AsyncClient, proc: Optional[subprocess.Popen], timeout_s: float) -> None:
+    """
+    Wait until /ready is 200 (every preloaded model has finished loading), or
+    /ping for a --url server that predates /ready.
+    """
+    deadline = time.monotonic() + timeout_s
+    path = "/ready"
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"API server exited with code {proc.returncode}")
+        try:
+            status = (await client.get(path)).status_code
+            if status == 200:
+                return
+            if status == 404 and path == "/ready":
+                path = "/ping"
+                continue
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("API server did not become ready in time")
+
+
+# -----------------------
+# load
+# -----------------------
+def scenario_requests(name: str, images: Dict[str, List[bytes]], classes: List[str]) -> Callable:
+    """A function issuing the scenario's next request (crops, images and labels cycle)."""
+    crops = itertools.cycle(images)
+    pools = {crop: itertools.cycle(imgs) for crop, imgs in images.items()}
+    locations = itertools.cycle(LOCATIONS)
+    labels = itertools.cycle(classes)
+
+    def predict(client: httpx.AsyncClient):
+        crop = next(crops)
+        data = {"crop_type": crop}
+        if name == "predict_weather":
+            data["location"] = next(locations)
+        return client.post("/predict", files={"file": ("leaf.jpg", next(pools[crop]), "image/jpeg")}, data=data)
+
+    def treatment(client: httpx.AsyncClient):
+        return client.get(f"/treatment/{next(labels)}")
+
+    return treatment if name == "treatment" else predict
+
+
+async def drive(client: httpx.AsyncClient, request_fn, concurrency: int, seconds: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    stop_at = time.perf_counter() + seconds
+
+    async def user():
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                r = await request_fn(client)
+                status = r.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - t0
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return {
+        "requests": sum(statuses.values()),
+        "requests_per_s": round(len(latencies) / wall, 2),
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "latency": latency_stats(latencies),
+    }
+
+
+async def run(args, base_url: str, api_proc: Optional[subprocess.Popen]) -> Dict:
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    crops = [c for c in args.crops.split(",") if c.strip()]
+    images = {crop: [synthetic_leaf(width, height, seed=i * 31 + n) for n in range(args.images)] for i, crop in enumerate(crops)}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await wait_ready(client, api_proc, args.startup_timeout)
+        classes = [label for crop in crops for label in CLASS_LABELS.get(crop, ())] or ["Early blight"]
+        results = {}
+        for name in args.scenarios.split(","):
+            request_fn = scenario_requests(name, images, classes)
+            await drive(client, request_fn, args.concurrency, args.warmup_seconds)  # traces, pools, caches
+            results[name] = await drive(client, request_fn, args.concurrency, args.seconds)
+            print(f"{name}: {results[name]['requests_per_s']} req/s, p95 {results[name]['latency'].get('p95_ms')} ms",
+                  file=sys.stderr)
+        stats = (await client.get("/stats")).json()
+    return {
+        "results": results,
+        "server": {
+            "batching": {crop: {k: b.get(k) for k in ("avg_batch_size", "batches", "rejected")} for crop, b in stats.get("batching", {}).items()},
+            "weather": {k: stats.get("weather", {}).get(k) for k in ("upstream_calls", "fresh_hits", "request_fetches", "coalesced")},
+            "prefetch_hit_rate": stats.get("prefetch", {}).get("prefetch_hit_rate"),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark this running server instead of starting one")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--crops", default=",".join(CROPS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--warmup-seconds", type=float, default=3.0)
+    parser.add_argument("--image-size", default="1600x1200", help="synthetic upload size, WxH")
+    parser.add_argument("--images", type=int, default=16, help="distinct images per crop")
+    parser.add_argument("--weather-latency-ms", type=float, default=150.0)
+    parser.add_argument("--weather-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--cache", action="store_true", help="keep the prediction cache on")
+    parser.add_argument("--stand-in", action="store_true", help="always use stand-in models")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {sorted(unknown)} (use {','.join(SCENARIOS)})")
+
+    stub = api = None
+    model_dir = stand_in_dir = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            model_dir = MODEL_DIR
+            have_models = all(os.path.exists(os.path.join(MODEL_DIR, f)) for f, _, _ in CROPS.values())
+            if args.stand_in or not have_models:
+                stand_in_dir = tempfile.mkdtemp(prefix="agri-models-")
+                model_dir = write_stand_in_models(stand_in_dir)
+            stub_port, api_port = free_port(), free_port()
+            stub = start_stub(stub_port, args.weather_latency_ms, args.weather_jitter_ms)
+            api = start_api(api_port, model_dir, f"http://127.0.0.1:{stub_port}", args.cache)
+            base_url = f"http://127.0.0.1:{api_port}"
+        out = asyncio.run(run(args, base_url, api))
+    finally:
+        stop(api)
+        stop(stub)
+        if stand_in_dir is not None:
+            shutil.rmtree(stand_in_dir, ignore_errors=True)
+
+    config = {k: getattr(args, k) for k in ("concurrency", "seconds", "image_size", "images", "weather_latency_ms", "cache")}
+    emit({"benchmark": "load", "url": args.url, "model_dir": model_dir, "config": config, **out}, args.output)
+
+
+if __name__ == "__main__":
+    main()
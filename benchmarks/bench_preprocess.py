@@ -0,0 +1,122 @@
+# bench_preprocess.py
+"""
+Compare the original preprocessing (full decode, resize, separate float32
+copies) with api.preprocessing (JPEG draft decode, staged resize, one-pass
+normalization) at typical phone upload sizes, plus the normalize-only path
+of pre-resized tensors (/predict/tensor).
+
+    python -m benchmarks.bench_preprocess --sizes 1024x768,4032x3024
+"""
+import argparse
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from api.preprocessing import normalize_into, preprocess_256, preprocess_rice
+from benchmarks.common import emit, time_calls
+
+
+# -----------------------
+# original implementations (before api/preprocessing.py)
+# -----------------------
+def legacy_preprocess_256(img_bytes: bytes) -> np.ndarray:
+    img = Image.open(BytesIO(img_bytes)).convert("RGB")
+    img = img.resize((256, 256))
+    arr = np.array(img).astype(np.float32) / 255.0
+    arr = np.expand_dims(arr, 0)
+    return arr
+
+
+def legacy_preprocess_rice(img_bytes: bytes) -> np.ndarray:
+    img = Image.open(BytesIO(img_bytes)).convert("RGB")
+    img = img.resize((224, 224))
+    arr = np.array(img).astype(np.float32)
+    arr = np.expand_dims(arr, 0)
+    return arr  # EfficientNetV2 preprocess_input is a pass-through
+
+
+def synthetic_leaf(width: int, height: int, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """A smooth green-ish image with noise, so JPEG sizes resemble real photos."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack(
+        [
+            60 + 40 * np.sin(xx / 97.0),
+            140 + 60 * np.cos(yy / 131.0),
+            50 + 30 * np.sin((xx + yy) / 173.0),
+        ],
+        axis=-1,
+    )
+    base += rng.normal(0, 12, base.shape)
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    buf = BytesIO()
+    img.save(buf, format=fmt, quality=90) if fmt == "JPEG" else img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def peak_numpy_mb(fn, data: bytes) -> float:
+    """Peak Python-tracked allocation (numpy arrays; Pillow's own buffers are not traced)."""
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1e6, 2)
+
+
+def decoded_rgb_mb(data: bytes, size: int, draft: bool) -> float:
+    """Size of the full-resolution RGB buffer Pillow allocates while decoding."""
+    img = Image.open(BytesIO(data))
+    if draft and img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    w, h = img.size
+    return round(w * h * 3 / 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1024x768,2048x1536,4032x3024")
+    parser.add_argument("--formats", default="JPEG,PNG")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    pairs = {
+        "preprocess_256": (legacy_preprocess_256, preprocess_256, 256),
+        "preprocess_rice": (legacy_preprocess_rice, preprocess_rice, 224),
+    }
+    results = {}
+    for size in args.sizes.split(","):
+        w, h = (int(v) for v in size.lower().split("x"))
+        for fmt in args.formats.split(","):
+            data = synthetic_leaf(w, h, fmt)
+            case = {"upload_mb": round(len(data) / 1e6, 2)}
+            for name, (legacy, fast, target) in pairs.items():
+                before = time_calls(lambda: legacy(data), args.repeats, warmup=1)
+                after = time_calls(lambda: fast(data), args.repeats, warmup=1)
+                case[name] = {
+                    "legacy": before,
+                    "fast": after,
+                    "speedup_p50": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None,
+                    "legacy_peak_numpy_mb": peak_numpy_mb(legacy, data),
+                    "fast_peak_numpy_mb": peak_numpy_mb(fast, data),
+                    "legacy_decoded_rgb_mb": decoded_rgb_mb(data, target, draft=False),
+                    "fast_decoded_rgb_mb": decoded_rgb_mb(data, target, draft=True),
+                    "max_abs_diff": round(float(np.abs(legacy(data) - fast(data)).max()), 4),
+                }
+            results[f"{size}-{fmt.lower()}"] = case
+
+    # /predict/tensor: pixels arrive resized, only normalization is left
+    rng = np.random.default_rng(0)
+    for name, target, mode in (("normalize_into_256", 256, "rescale"), ("normalize_into_rice", 224, "efficientnet")):
+        results[name] = {}
+        for n in (1, 16):
+            pixels = rng.integers(0, 256, (n, target, target, 3), dtype=np.uint8)
+            out = np.empty(pixels.shape, dtype=np.float32)
+            results[name][f"batch_{n}"] = time_calls(lambda: normalize_into(pixels, mode, out), args.repeats, warmup=1)
+    emit({"benchmark": "preprocess", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
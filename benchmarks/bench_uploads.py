@@ -0,0 +1,121 @@
+# bench_uploads.py
+"""
+Peak memory of ingesting one upload: the original path (`await file.read()`
+then a full decode, no limits) against api.uploads.read_upload plus
+api.preprocessing with the header checks /predict uses.
+
+Each case runs in a forked child whose peak RSS (VmHWM) is reset first, so
+Pillow's decode buffers are included. Linux only.
+
+    python -m benchmarks.bench_uploads --max-pixels 50000000
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from api.preprocessing import UPLOAD_FORMATS, preprocess_image
+from api.uploads import read_upload
+from benchmarks.bench_preprocess import legacy_preprocess_256, synthetic_leaf
+from benchmarks.common import emit
+
+
+def bomb_png(side: int) -> bytes:
+    """A tiny file that declares `side` x `side` pixels (a decompression bomb)."""
+    buf = BytesIO()
+    Image.new("RGB", (side, side)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def spooled_upload(data: bytes) -> UploadFile:
+    """An UploadFile backed by a spooled temp file, as the multipart parser builds it."""
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(data)
+    spool.seek(0)
+    return UploadFile(spool, size=len(data), filename="leaf")
+
+
+async def legacy_ingest(data: bytes, max_bytes: int, max_pixels: int):
+    img_bytes = await spooled_upload(data).read()
+    return legacy_preprocess_256(img_bytes)
+
+
+async def bounded_ingest(data: bytes, max_bytes: int, max_pixels: int):
+    img_bytes = await read_upload(spooled_upload(data), max_bytes)
+    return preprocess_image(img_bytes, 256, "rescale", max_pixels=max_pixels, formats=UPLOAD_FORMATS)
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def _child(path, data, max_bytes, max_pixels, queue):
+    ingest = {"legacy": legacy_ingest, "bounded": bounded_ingest}[path]
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # reset VmHWM to the current RSS
+    base = _status_kb("VmRSS")
+    t0 = time.perf_counter()
+    try:
+        asyncio.run(ingest(data, max_bytes, max_pixels))
+        outcome = "ok"
+    except HTTPException as e:
+        outcome = f"{e.status_code} {e.detail}"
+    except Exception as e:
+        outcome = f"error: {type(e).__name__}: {e}"
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    queue.put({
+        "outcome": outcome[:120],
+        "peak_extra_mb": round((_status_kb("VmHWM") - base) / 1024.0, 1),
+        "ms": round(elapsed_ms, 2),
+    })
+
+
+def measure(path: str, data: bytes, max_bytes: int, max_pixels: int) -> dict:
+    ctx = mp.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(path, data, max_bytes, max_pixels, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-bytes", type=int, default=20 * 1024 * 1024)
+    parser.add_argument("--max-pixels", type=int, default=50_000_000)
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/clear_refs"):
+        raise SystemExit("needs Linux /proc to reset and read peak RSS")
+
+    cases = {
+        "jpeg_4032x3024": synthetic_leaf(4032, 3024, "JPEG"),
+        "png_2048x1536": synthetic_leaf(2048, 1536, "PNG"),
+        "bomb_png_10000x10000": bomb_png(10000),
+        "random_bytes_over_cap": np.random.default_rng(0).bytes(args.max_bytes + 1024 * 1024),
+    }
+    results = {}
+    for name, data in cases.items():
+        results[name] = {
+            "upload_mb": round(len(data) / 1e6, 2),
+            "legacy": measure("legacy", data, args.max_bytes, args.max_pixels),
+            "bounded": measure("bounded", data, args.max_bytes, args.max_pixels),
+        }
+    emit({"benchmark": "uploads", "max_bytes": args.max_bytes, "max_pixels": args.max_pixels, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench_weather.py
+"""
+Cost of the weather helpers without the network: spray-advice summaries
+(one location as /predict does it, and many plots x horizons as
+/weather-advice does) and a cached forecast lookup.
+
+    python -m benchmarks.bench_weather --plots 1,100,1000,5000 --horizons 1,3,5
+"""
+import argparse
+import asyncio
+import time
+
+from api.weather import WeatherClient
+from api.weather_advice import advise
+from benchmarks.common import emit, latency_stats, time_calls
+from benchmarks.openweather_stub import fake_forecast
+
+
+def forecasts_for(n: int):
+    # ~0.1 deg apart, i.e. a distinct forecast grid cell per plot
+    return [fake_forecast(18.0 + (i % 100) * 0.1, 73.0 + (i // 100) * 0.1) for i in range(n)]
+
+
+def cached_lookup_stats(repeats: int):
+    """Latency of WeatherClient.forecast() answered from its cache."""
+    client = WeatherClient("bench")
+    cells = [client.forecast_cell(18.0 + i * 0.1, 73.0) for i in range(64)]
+    for cell in cells:
+        client.forecast_cache.set(cell, fake_forecast(*cell))
+
+    async def run():
+        samples = []
+        for i in range(repeats):
+            lat, lon = cells[i % len(cells)]
+            t0 = time.perf_counter()
+            await client.forecast(lat, lon)
+            samples.append(time.perf_counter() - t0)
+        return latency_stats(samples)
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", default="1,100,1000,5000")
+    parser.add_argument("--horizons", default="1,3,5")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    horizons = [int(h) for h in args.horizons.split(",")]
+    rules = {"heavy_rain_mm": 10, "humidity_high_pct": 85}
+    one = forecasts_for(1)
+    results = {
+        "summary_one_location_3d": time_calls(lambda: advise(one, [3], [rules]), args.repeats * 100, warmup=10),
+        "cached_forecast_lookup": cached_lookup_stats(args.repeats * 1000),
+        "advise": {},
+    }
+    for n in (int(p) for p in args.plots.split(",")):
+        fcs = forecasts_for(n)
+        stats = time_calls(lambda: advise(fcs, horizons, [rules] * n), args.repeats, warmup=1)
+        stats["plots_per_s"] = round(n / (stats["p50_ms"] / 1000.0), 1) if stats["p50_ms"] else None
+        results["advise"][str(n)] = stats
+    emit({"benchmark": "weather", "horizons_days": horizons, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# bench_workers.py
+"""
+Memory and throughput of `python -m api.serve` from 1 to N workers, with
+models shared through the inference server vs loaded by every worker.
+
+For each worker count the server is started on a free port, every crop is
+warmed up, then /predict is driven at `--concurrency` for `--seconds`.
+Memory is summed over the whole process tree (launcher, workers, inference
+server): PSS counts shared pages once, so it is the number that shows
+what sharing saves; RSS is given for comparison.
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --concurrency 16 --seconds 20
+
+Uses the models in MODEL_DIR, or stand-ins written to a temp directory when
+none are there (`--stand-in` forces that).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_preprocess import synthetic_leaf
+from benchmarks.common import CROPS, MODEL_DIR, REPO_DIR, emit, free_port, latency_stats, write_stand_in_models
+
+
+# -----------------------
+# process tree memory
+# -----------------------
+def descendants(root: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        pids.append(pid)
+        todo.extend(children.get(pid, []))
+    return pids
+
+
+def tree_memory_mb(root: int) -> Dict[str, float]:
+    totals = {"Rss": 0, "Pss": 0}
+    pids = descendants(root)
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    key = line.split(":", 1)[0]
+                    if key in totals:
+                        totals[key] += int(line.split()[1])
+        except OSError:
+            continue
+    return {"processes": len(pids), "rss_mb": round(totals["Rss"] / 1024, 1), "pss_mb": round(totals["Pss"] / 1024, 1)}
+
+
+# -----------------------
+# server lifecycle + load
+# -----------------------
+def start_server(workers: int, shared: bool, port: int, model_dir: str) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "api.serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port),
+           "--socket", os.path.join(tempfile.gettempdir(), f"agri-bench-{port}.sock")]
+    if not shared:
+        cmd.append("--no-shared-models")
+    env = dict(os.environ, MODEL_DIR=model_dir, MODEL_PRELOAD="all", PYTHONPATH=REPO_DIR)
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"api.serve exited with code {proc.returncode}")
+        try:
+            if (await client.get("/ping")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start in time")
+
+
+async def drive(client: httpx.AsyncClient, images: List[bytes], concurrency: int, seconds: float) -> Dict:
+    crops = itertools.cycle(CROPS)
+    pool = itertools.cycle(images)
+    latencies, errors = [], 0
+    stop = time.perf_counter() + seconds
+
+    async def user():
+        nonlocal errors
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            r = await client.post("/predict", files={"file": ("leaf.jpg", next(pool))}, data={"crop_type": next(crops)})
+            if r.status_code == 200:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {"requests_per_s": round(len(latencies) / elapsed, 2), "errors": errors, "latency": latency_stats(latencies)}
+
+
+async def run_case(workers: int, shared: bool, args, model_dir: str, images: List[bytes]) -> Dict:
+    port = free_port()
+    proc = start_server(workers, shared, port, model_dir)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await wait_ready(client, proc, args.startup_timeout)
+            # every worker loads / connects each crop on first use: warm them all
+            await drive(client, images, max(args.concurrency, workers * len(CROPS)), 3.0)
+            idle = tree_memory_mb(proc.pid)
+            load = await drive(client, images, args.concurrency, args.seconds)
+            return {"memory_after_warmup": idle, "memory_under_load": tree_memory_mb(proc.pid), **load}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--modes", default="shared,per-worker", help="shared and/or per-worker model loading")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--stand-in", action="store_true", help="always use stand-in models")
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args()
+
+    model_dir = MODEL_DIR
+    have_models = all(os.path.exists(os.path.join(MODEL_DIR, f)) for f, _, _ in CROPS.values())
+    if args.stand_in or not have_models:
+        model_dir = write_stand_in_models(tempfile.mkdtemp(prefix="agri-models-"))
+    images = [synthetic_leaf(1600, 1200, seed=i) for i in range(8)]
+
+    results = {}
+    for mode in args.modes.split(","):
+        for n in (int(w) for w in args.workers.split(",")):
+            results[f"{mode}-{n}"] = asyncio.run(run_case(n, mode == "shared", args, model_dir, images))
+            print(f"{mode} x{n}: {results[f'{mode}-{n}']['requests_per_s']} req/s", file=sys.stderr)
+    emit({"benchmark": "workers", "model_dir": model_dir, "concurrency": args.concurrency, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# common.py
+"""Shared helpers for the benchmark scripts (timing, stand-in models, JSON output)."""
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(REPO_DIR, "api", "saved_models"))
+
+# crop -> (model file, input size, number of classes)
+CROPS = {
+    "potato": ("potato_v1.keras", 256, 3),
+    "tomato": ("tomato_v1.keras", 256, 10),
+    "pepper": ("pepper_v1.keras", 256, 2),
+    "rice": ("rice_v1.keras", 224, 10),
+}
+
+
+def latency_stats(samples_s) -> Dict[str, float]:
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds."""
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if ms.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeats: int, warmup: int = 0) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return latency_stats(samples)
+
+
+def stand_in_model(input_size: int, num_classes: int, seed: int = 0):
+    """Small randomly initialised CNN with the same input/output shape as a crop model."""
+    import tensorflow as tf
+
+    tf.random.set_seed(seed)
+    return tf.keras.Sequential(
+        [
+            tf.keras.Input((input_size, input_size, 3)),
+            tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+            tf.keras.layers.MaxPooling2D(),
+            tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.Dense(num_classes, activation="softmax"),
+        ]
+    )
+
+
+def load_or_stand_in(crop: str, model_dir: Optional[str] = None):
+    """Real model from saved_models/ if present, otherwise a stand-in. Returns (model, input_size, is_real)."""
+    import tensorflow as tf
+
+    filename, size, n_classes = CROPS[crop]
+    path = os.path.join(model_dir or MODEL_DIR, filename)
+    if os.path.exists(path):
+        return tf.keras.models.load_model(path), size, True
+    return stand_in_model(size, n_classes), size, False
+
+
+def write_stand_in_models(model_dir: str) -> str:
+    """Save a stand-in .keras model for every crop missing from `model_dir`; returns `model_dir`."""
+    os.makedirs(model_dir, exist_ok=True)
+    for crop, (filename, size, n_classes) in CROPS.items():
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            stand_in_model(size, n_classes, seed=len(crop)).save(path)
+    return model_dir
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Commit and machine details stored with every result, so runs can be compared across commits."""
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def emit(results: Dict[str, Any], output: Optional[str] = None) -> None:
+    """Print results as JSON, with run metadata (and write them to `output` if given)."""
+    results = dict(results, meta=run_metadata())
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.stdout.write(text + "\n")
@@ -0,0 +1,75 @@
+# compare.py
+"""
+Compare two result files from the same benchmark (e.g. before / after a commit).
+
+    python -m benchmarks.bench_load --output base.json     # on the old commit
+    python -m benchmarks.bench_load --output new.json      # on the new one
+    python -m benchmarks.compare base.json new.json --threshold 10
+
+Prints every latency (`*_ms`) and throughput (`*_per_s`) figure found in
+both files with its relative change, and exits with status 1 when one got
+worse by more than --threshold percent (latency up / throughput down).
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+
+def metrics(tree: Any, path: str = "") -> Iterator[Tuple[str, float]]:
+    """(dotted path, value) for every latency / throughput number in a result tree."""
+    if isinstance(tree, dict):
+        for key, value in tree.items():
+            if key == "meta":
+                continue
+            sub = f"{path}.{key}" if path else str(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key.endswith("_ms") or key.endswith("_per_s"):
+                    yield sub, float(value)
+            else:
+                yield from metrics(value, sub)
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold_pct: float) -> Dict[str, Any]:
+    before = dict(metrics(base))
+    changes, regressions = {}, []
+    for name, after in metrics(new):
+        if name not in before:
+            continue
+        old = before[name]
+        change = round((after - old) / old * 100.0, 2) if old else None
+        changes[name] = {"base": old, "new": after, "change_pct": change}
+        # higher latency or lower throughput is worse
+        worse = change is not None and (change > threshold_pct if name.endswith("_ms") else change < -threshold_pct)
+        if worse:
+            regressions.append(name)
+    return {
+        "benchmark": new.get("benchmark"),
+        "base": base.get("meta"),
+        "new": new.get("meta"),
+        "threshold_pct": threshold_pct,
+        "changes": changes,
+        "regressions": regressions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if base.get("benchmark") != new.get("benchmark"):
+        parser.error(f"different benchmarks: {base.get('benchmark')} vs {new.get('benchmark')}")
+    report = compare(base, new, args.threshold)
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
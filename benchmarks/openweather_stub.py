@@ -0,0 +1,118 @@
+# openweather_stub.py
+"""
+Local stand-in for the OpenWeather geocode and 5-day forecast endpoints,
+with adjustable latency and failures, for load tests and client checks
+(tests/test_weather_client.py).
+
+    python -m benchmarks.openweather_stub --port 8900 --latency-ms 150
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8900 OPENWEATHER_API_KEY=stub uvicorn api.main:app
+
+GET /_stats returns how many upstream calls each endpoint received; POST
+/_config changes latency and failures at runtime and resets the counts.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()[:8], 16)
+
+
+def fake_forecast(lat: float, lon: float, entries: int = 40) -> dict:
+    """Deterministic 5 day / 3 hour forecast shaped like OpenWeather's response."""
+    rng = random.Random(_seed(round(lat, 2), round(lon, 2)))
+    start = int(time.time()) // 10800 * 10800
+    wet = rng.random()
+    items = []
+    for i in range(entries):
+        item = {
+            "dt": start + i * 10800,
+            "main": {"temp": round(rng.uniform(18, 34), 1), "humidity": int(rng.uniform(45, 98))},
+            "pop": round(min(1.0, rng.random() * (0.5 + wet)), 2),
+        }
+        if rng.random() < wet * 0.6:
+            item["rain"] = {"3h": round(rng.uniform(0.1, 4.0), 2)}
+        items.append(item)
+    return {"cod": "200", "cnt": entries, "list": items, "city": {"coord": {"lat": lat, "lon": lon}}}
+
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, error_status: int = 503) -> FastAPI:
+    app = FastAPI(title="OpenWeather stub")
+    app.state.latency_ms = latency_ms
+    app.state.jitter_ms = jitter_ms
+    app.state.error_rate = error_rate
+    app.state.error_status = error_status
+    app.state.fail_first = 0  # the next N calls fail with error_status
+    calls: Counter = Counter()
+
+    async def _simulate(endpoint: str) -> None:
+        calls[endpoint] += 1
+        delay = app.state.latency_ms + random.uniform(0, app.state.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        failing = app.state.fail_first > 0
+        if failing:
+            app.state.fail_first -= 1
+        if failing or (app.state.error_rate and random.random() < app.state.error_rate):
+            raise HTTPException(status_code=app.state.error_status, detail="stub: simulated upstream failure")
+
+    @app.get("/geo/1.0/direct")
+    async def geocode(q: str, limit: int = 1, appid: Optional[str] = None):
+        await _simulate("geocode")
+        seed = _seed(q.strip().lower())
+        lat = (seed % 12000) / 100.0 - 60.0
+        lon = (seed // 12000 % 36000) / 100.0 - 180.0
+        return [{"name": q, "lat": lat, "lon": lon, "country": "XX"}][:limit]
+
+    @app.get("/data/2.5/forecast")
+    async def forecast(lat: float, lon: float, units: str = "metric", appid: Optional[str] = None):
+        await _simulate("forecast")
+        return fake_forecast(lat, lon)
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(calls)
+
+    @app.post("/_config")
+    async def configure(
+        latency_ms: Optional[float] = Query(None),
+        jitter_ms: Optional[float] = Query(None),
+        error_rate: Optional[float] = Query(None),
+        error_status: Optional[int] = Query(None),
+        fail_first: Optional[int] = Query(None),
+    ):
+        settings = {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+                    "error_status": error_status, "fail_first": fail_first}
+        for name, value in settings.items():
+            if value is not None:
+                setattr(app.state, name, value)
+        calls.clear()
+        return {name: getattr(app.state, name) for name in settings}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of simulated failures")
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# test_uploads.py
+"""
+Upload limits: read_upload and BodySizeLimitMiddleware refuse oversized bodies
+with 413, decode() refuses images over max_pixels from the header, and the
+/predict ingestion path keeps peak memory bounded for a large JPEG and for a
+decompression bomb.
+
+    python -m pytest tests/test_uploads.py -q
+"""
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from PIL import Image, UnidentifiedImageError
+
+from api.preprocessing import ImageTooLarge, decode
+from api.uploads import BodySizeLimitMiddleware, read_upload
+from benchmarks.bench_preprocess import synthetic_leaf
+from benchmarks.bench_uploads import bomb_png, measure, spooled_upload
+
+MAX_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000
+
+
+def png(width: int, height: int) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (width, height)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# -----------------------
+# read_upload
+# -----------------------
+def test_read_upload_returns_bytes_up_to_the_cap():
+    data = b"x" * 1000
+    assert asyncio.run(read_upload(spooled_upload(data), 1000)) == data
+
+
+@pytest.mark.parametrize("known_size", [True, False])
+def test_read_upload_refuses_over_the_cap(known_size):
+    upload = spooled_upload(b"x" * 1001)
+    if not known_size:
+        upload.size = None  # no part size from the parser: counted while reading
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(read_upload(upload, 1000, chunk_size=256))
+    assert e.value.status_code == 413
+
+
+# -----------------------
+# BodySizeLimitMiddleware
+# -----------------------
+@pytest.fixture
+def limited_client():
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=1000)
+    app.state.bodies_read = 0
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        app.state.bodies_read += 1
+        return {"size": len(body)}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_body_limit_allows_bodies_up_to_the_cap(limited_client):
+    r = limited_client.post("/echo", content=b"x" * 1000)
+    assert r.status_code == 200 and r.json() == {"size": 1000}
+
+
+def test_body_limit_rejects_large_content_length_before_the_handler(limited_client):
+    r = limited_client.post("/echo", content=b"x" * 1001)
+    assert r.status_code == 413
+    assert limited_client.app.state.bodies_read == 0
+
+
+def test_body_limit_rejects_large_chunked_body(limited_client):
+    def chunks():
+        for _ in range(8):
+            yield b"x" * 256
+
+    r = limited_client.post("/echo", content=chunks())  # no Content-Length: Transfer-Encoding chunked
+    assert r.status_code == 413
+    assert limited_client.app.state.bodies_read == 0
+
+
+# -----------------------
+# decode
+# -----------------------
+def test_decode_refuses_images_over_max_pixels():
+    with pytest.raises(ImageTooLarge):
+        decode(png(2000, 1000), 256, max_pixels=1_999_999)
+    assert decode(png(2000, 1000), 256, max_pixels=2_000_000).size == (2000, 1000)
+
+
+def test_decode_refuses_formats_outside_the_allowed_ones():
+    with pytest.raises(UnidentifiedImageError):
+        decode(png(64, 64), 64, formats=("JPEG",))
+
+
+# -----------------------
+# peak memory (forked child, peak RSS reset first; Linux only)
+# -----------------------
+needs_proc = pytest.mark.skipif(not os.path.exists("/proc/self/clear_refs"), reason="needs Linux /proc to read peak RSS")
+
+
+@needs_proc
+def test_large_jpeg_is_ingested_without_a_full_resolution_decode():
+    # a 12 MP photo is ~36 MB as full-resolution RGB; draft decoding stays well under that
+    result = measure("bounded", synthetic_leaf(4032, 3024, "JPEG"), MAX_BYTES, MAX_PIXELS)
+    assert result["outcome"] == "ok"
+    assert result["peak_extra_mb"] < 24
+
+
+@needs_proc
+def test_decompression_bomb_is_refused_before_decoding():
+    # 10000 x 10000 declared pixels (~300 MB as RGB) in a ~300 KB file
+    result = measure("bounded", bomb_png(10000), MAX_BYTES, MAX_PIXELS)
+    assert "ImageTooLarge" in result["outcome"]
+    assert result["peak_extra_mb"] < 16
@@ -0,0 +1,164 @@
+# test_weather_client.py
+"""
+WeatherClient against the local OpenWeather stub (benchmarks/openweather_stub.py):
+request coalescing, and retries with backoff on 5xx but not on 4xx.
+
+    python -m pytest tests/test_weather_client.py -q
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+
+from api.weather import WeatherClient
+from benchmarks.common import free_port
+from benchmarks.openweather_stub import create_app
+
+BACKOFF_S = 0.05
+RETRIES = 2
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("OpenWeather stub did not start")
+        time.sleep(0.05)
+    yield url
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+def configure(url: str, **settings) -> None:
+    """Reset the stub (no latency, no failures, zero call counts) and apply `settings`."""
+    params = dict({"latency_ms": 0, "jitter_ms": 0, "error_rate": 0, "error_status": 503, "fail_first": 0}, **settings)
+    httpx.post(f"{url}/_config", params=params).raise_for_status()
+
+
+def upstream_calls(url: str, endpoint: str = "forecast") -> int:
+    return httpx.get(f"{url}/_stats").json().get(endpoint, 0)
+
+
+def client_for(url: str) -> WeatherClient:
+    return WeatherClient("stub", base_url=url, retries=RETRIES, backoff_s=BACKOFF_S)
+
+
+def run(url: str, coro_fn):
+    """(client, result of `coro_fn(client)`), on a fresh loop with a fresh client pointed at the stub."""
+    async def main():
+        client = client_for(url)
+        try:
+            return client, await coro_fn(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+# -----------------------
+# coalescing
+# -----------------------
+def test_concurrent_forecasts_for_one_cell_share_one_upstream_request(stub_url):
+    configure(stub_url, latency_ms=200)
+    n = 20
+
+    async def burst(client):
+        # different coordinates, same 0.1 deg forecast cell
+        return await asyncio.gather(*(client.forecast(18.52 + i * 0.001, 73.85) for i in range(n)))
+
+    client, results = run(stub_url, burst)
+    assert upstream_calls(stub_url) == 1
+    assert client.upstream_calls == 1
+    assert client.coalesced == n - 1
+    assert all(r is not None and r == results[0] for r in results)
+
+
+def test_concurrent_geocodes_share_one_upstream_request(stub_url):
+    configure(stub_url, latency_ms=200)
+
+    async def burst(client):
+        return await asyncio.gather(*(client.geocode(name) for name in ("Pune", " pune", "PUNE", "Pune ")))
+
+    _, results = run(stub_url, burst)
+    assert upstream_calls(stub_url, "geocode") == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_request(stub_url):
+    configure(stub_url, latency_ms=200)
+
+    async def scenario(client):
+        first = asyncio.ensure_future(client.forecast(18.52, 73.85))
+        second = asyncio.ensure_future(client.forecast(18.52, 73.85))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        return await second
+
+    _, result = run(stub_url, scenario)
+    assert result is not None
+    assert upstream_calls(stub_url) == 1
+
+
+# -----------------------
+# retries and backoff
+# -----------------------
+@pytest.mark.parametrize("status", [500, 502, 503, 429])
+def test_retryable_statuses_are_retried_with_backoff(stub_url, status):
+    configure(stub_url, error_rate=1, error_status=status)
+
+    async def timed(client):
+        t0 = time.perf_counter()
+        result = await client.forecast(18.52, 73.85)
+        return result, time.perf_counter() - t0
+
+    client, (result, elapsed) = run(stub_url, timed)
+    assert result is None
+    assert upstream_calls(stub_url) == RETRIES + 1
+    assert client.retried == RETRIES
+    assert client.failures == 1
+    # exponential backoff: BACKOFF_S, then 2 * BACKOFF_S
+    assert elapsed >= BACKOFF_S * (2 ** RETRIES - 1)
+
+
+def test_transient_5xx_recovers_on_retry(stub_url):
+    configure(stub_url, fail_first=1, error_status=503)
+
+    client, result = run(stub_url, lambda client: client.forecast(18.52, 73.85))
+    assert result is not None and result["list"]
+    assert upstream_calls(stub_url) == 2
+    assert client.retried == 1
+    assert client.failures == 0
+    assert client.forecast_cache.get(client.forecast_cell(18.52, 73.85)) == result
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(stub_url, status):
+    configure(stub_url, error_rate=1, error_status=status)
+
+    client, result = run(stub_url, lambda client: client.forecast(18.52, 73.85))
+    assert result is None
+    assert upstream_calls(stub_url) == 1
+    assert client.retried == 0
+    assert client.failures == 1
+
+
+def test_failed_fetch_is_not_cached(stub_url):
+    configure(stub_url, error_rate=1, error_status=404)
+
+    async def twice(client):
+        await client.forecast(18.52, 73.85)
+        configure(stub_url)
+        return await client.forecast(18.52, 73.85)
+
+    _, result = run(stub_url, twice)
+    assert result is not None
+    assert upstream_calls(stub_url) == 1  # counts were reset by configure(); this is the second fetch